@@ -330,11 +330,19 @@ def cleanup_old_tasks():
             print(f"[清理] 已删除用户 {user_id} 的旧任务记录")
 
 
+def cleanup_expired_sessions():
+    # 单条按 expires_at 索引的 DELETE，放在后台线程执行，不占用请求路径（WAL 下读请求不被阻塞）
+    expired = system.user_manager.cleanup_expired_sessions()
+    if expired:
+        print(f"[清理] 已删除 {expired} 个过期会话")
+
+
 def start_cleanup_timer():
     def cleanup_loop():
         while True:
             time.sleep(1800)
             cleanup_old_tasks()
+            cleanup_expired_sessions()
 
     cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
     cleanup_thread.start()
@@ -464,9 +472,13 @@ def api_get_keyword_groups():
     # 检查是否包含已禁用的组
     include_inactive = request.args.get("include_inactive", "false").lower() == "true"
 
+    # 可选分页参数（不传则返回全部）
+    limit = request.args.get("limit", type=int)
+    offset = request.args.get("offset", 0, type=int)
+
     # 获取用户的所有组
     groups = keyword_group_manager.get_user_groups(
-        user_id, include_inactive=include_inactive
+        user_id, include_inactive=include_inactive, limit=limit, offset=offset
     )
 
     return jsonify({"success": True, "groups": groups})
@@ -606,6 +618,7 @@ def api_get_personalized_papers():
                 if active_group:
                     user_keywords = active_group.get('keywords', [])
         except Exception as e:
+            print(f"⚠️ 获取关键词组失败: {e}")
 
     if not user_keywords:
         return jsonify(
@@ -801,9 +814,6 @@ def api_get_group_papers(group_id):
         if h in system.cache.papers_cache:
             saved_papers.append(system.cache.papers_cache[h])
 
-    # 更新访问时间
-    keyword_group_manager.update_group_access_time(user_id, group_id)
-
     # 标记文献为已浏览（关键词组）
     paper_hashes = [p["hash"] for p in papers]
     for ph in paper_hashes:
@@ -1008,9 +1018,8 @@ def api_change_password():
                 )
                 if active_group:
                     user_keywords = active_group.get("keywords", [])
-                    print(
-                    )
         except Exception as e:
+            print(f"⚠️ 获取关键词组失败: {e}")
 
     if not user_keywords:
         return jsonify(
@@ -1100,9 +1109,6 @@ def api_change_password():
             for ph in paper_hashes:
                 keyword_group_manager.mark_paper_viewed_in_group(user_id, group_id, ph)
 
-        # 更新访问时间
-        keyword_group_manager.update_group_access_time(user_id, group_id)
-
         # 返回结果（包含分页信息）
         return jsonify(
             {
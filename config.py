@@ -46,5 +46,11 @@ DB_CONFIG = {
     'max_overflow': max(10, CPU_COUNT * 3)
 }
 
+# 密码哈希配置（未安装 argon2 时使用 PBKDF2）
+PASSWORD_CONFIG = {
+    # PBKDF2-HMAC-SHA512 迭代次数，可通过环境变量调整
+    'pbkdf2_iterations': int(os.getenv('PBKDF2_ITERATIONS', 100000))
+}
+
 print(f"[系统配置] 并行获取线程池: {PARALLEL_FETCH['max_workers']}")
 print(f"[系统配置] 数据库连接池: {DB_CONFIG['pool_size']}")
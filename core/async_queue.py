@@ -8,7 +8,7 @@ import multiprocessing
 import threading
 import queue
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Callable
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
@@ -236,7 +236,7 @@ class AsyncAnalysisQueue:
     
     def clear_results(self, max_age_minutes: int = 60):
         """清理过期的结果"""
-        cutoff_time = datetime.now() - __import__('datetime').timedelta(minutes=max_age_minutes)
+        cutoff_time = datetime.now() - timedelta(minutes=max_age_minutes)
         
         with self._lock:
             to_remove = [
@@ -16,6 +16,9 @@ from core.memory_cache import get_memory_cache
 
 import os
 
+# 单条 IN 查询的最大参数个数（低于 SQLite 默认 SQLITE_MAX_VARIABLE_NUMBER=999）
+IN_CHUNK_SIZE = 900
+
 class SmartCache:
     """
     智能缓存管理器 - V2.6 混合缓存版本
@@ -125,6 +128,7 @@ class SmartCache:
             existing = db.query(Paper).filter(Paper.id == paper_hash).first()
             
             if not existing:
+                now = datetime.now()
                 new_paper = Paper(
                     id=paper_hash,
                     title=paper.get('title', ''),
@@ -145,8 +149,8 @@ class SmartCache:
                     impact_factor=paper.get('impact_factor'),
                     citations=paper.get('citations', 0),
                     score=paper.get('score', 0.0),
-                    created_at=datetime.now(),
-                    updated_at=datetime.now()
+                    created_at=now,
+                    updated_at=now
                 )
                 db.add(new_paper)
                 db.commit()
@@ -207,18 +211,19 @@ class SmartCache:
             # 检查是否已存在
             existing = db.query(SearchCache).filter(SearchCache.id == search_hash).first()
 
+            now = datetime.now()
             if existing:
                 existing.paper_ids = paper_hashes
-                existing.created_at = datetime.now()
-                existing.expires_at = datetime.now() + timedelta(hours=48)  # 48小时过期
+                existing.created_at = now
+                existing.expires_at = now + timedelta(hours=48)  # 48小时过期
             else:
                 new_cache = SearchCache(
                     id=search_hash,
                     keywords=keywords,
                     days_back=days_back,
                     paper_ids=paper_hashes,
-                    created_at=datetime.now(),
-                    expires_at=datetime.now() + timedelta(hours=48)  # 48小时过期
+                    created_at=now,
+                    expires_at=now + timedelta(hours=48)  # 48小时过期
                 )
                 db.add(new_cache)
 
@@ -564,6 +569,28 @@ class SmartCache:
         finally:
             db.close()
     
+    def delete_paper(self, paper_hash: str) -> bool:
+        """
+        删除文献及其关键词索引
+        
+        Returns:
+            文献存在并已删除时返回 True
+        """
+        db = self._get_session()
+        try:
+            # keyword_index.paper_id 上有索引：只触及引用该文献的行，不扫描整个关键词索引
+            db.query(KeywordIndex).filter(KeywordIndex.paper_id == paper_hash).delete(synchronize_session=False)
+            deleted = db.query(Paper).filter(Paper.id == paper_hash).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+        
+        self.memory_cache.delete('paper', paper_hash)
+        return deleted > 0
+    
     def get_paper(self, paper_hash: str) -> Optional[Dict]:
         """获取单篇文献"""
         db = self._get_session()
@@ -579,9 +606,18 @@ class SmartCache:
         """批量获取缓存的文献"""
         db = self._get_session()
         try:
+            # 按块 IN 查询，N 次往返降为 ceil(N/IN_CHUNK_SIZE) 次
+            unique_hashes = list(dict.fromkeys(paper_hashes))
+            found = {}
+            for i in range(0, len(unique_hashes), IN_CHUNK_SIZE):
+                chunk = unique_hashes[i:i + IN_CHUNK_SIZE]
+                for paper in db.query(Paper).filter(Paper.id.in_(chunk)):
+                    found[paper.id] = paper
+            
+            # 保持调用方传入的顺序
             papers = []
             for paper_hash in paper_hashes:
-                paper = db.query(Paper).filter(Paper.id == paper_hash).first()
+                paper = found.get(paper_hash)
                 if paper:
                     papers.append(self._paper_to_dict(paper))
             return papers
@@ -600,6 +636,19 @@ class SmartCache:
         finally:
             db.close()
     
+    def get_papers_by_date(self, limit: int, offset: int = 0) -> List[Dict]:
+        """按发表日期倒序分页获取文献（走 idx_papers_pub_date 索引，只加载当前页）"""
+        db = self._get_session()
+        try:
+            papers = (db.query(Paper)
+                      .order_by(Paper.pub_date.desc(), Paper.id.desc())
+                      .offset(offset)
+                      .limit(limit)
+                      .all())
+            return [self._paper_to_dict(paper) for paper in papers]
+        finally:
+            db.close()
+    
     @property
     def papers_cache(self) -> Dict[str, Dict]:
         """兼容属性 - 返回所有文献的字典格式"""
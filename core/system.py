@@ -17,30 +17,51 @@ if grandparent_dir not in sys.path:
     sys.path.insert(0, grandparent_dir)
 
 from datetime import datetime
+from functools import cached_property
 from typing import Dict, List
 
 # 加载环境变量（使用绝对路径）
 _current_dir = os.path.dirname(os.path.abspath(__file__))
 env_file = os.path.join(_current_dir, ".env")
-if os.path.exists(env_file):
-    with open(env_file, "r") as f:
+
+# 模块被 reload 或重复收集（pytest）时不再重复解析 .env
+_ENV_LOADED = globals().get("_ENV_LOADED", False)
+
+
+def _load_env_file(path: str):
+    """逐行解析 .env 文件并写入环境变量（去除值两侧的引号）"""
+    try:
+        f = open(path, "r")
+    except FileNotFoundError:
+        return
+    with f:
         for line in f:
+            if "=" not in line:
+                continue
             line = line.strip()
-            if line and not line.startswith("#") and "=" in line:
-                key, value = line.split("=", 1)
-                os.environ[key] = value
+            if not line or line[0] == "#":
+                continue
+            key, _, value = line.partition("=")
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+                value = value[1:-1]
+            os.environ[key.strip()] = value
+
+
+if not _ENV_LOADED:
+    _load_env_file(env_file)
+    _ENV_LOADED = True
 
 # 导入本地模块（新目录结构）
 from models.user_manager import UserManager, get_predefined_categories, expand_keywords
 from core.cache_manager import SmartCache, CacheOptimizer
 from services.push_service import PersonalizedPushEngine, PushScheduler
 from core.analyzer import OptimizedAnalyzer, AnalysisQueue
-from models.keyword_group_manager import KeywordGroupManager
 
-# 导入v1模块（复用fetcher和scorer）- 从项目根目录
-from v1.fetcher import PaperFetcher
+# 导入v1模块（复用scorer）- 从项目根目录
+# fetcher / impact_factor / keyword_group_manager 较重，在首次使用时再导入，
+# 让 --stats、--cleanup 等不需要抓取的入口启动更快
 from v1.scorer import scorer
-from v1.impact_factor import ImpactFactorFetcher
 
 
 class LiteraturePushSystemV2:
@@ -75,15 +96,25 @@ class LiteraturePushSystemV2:
         self.cache_optimizer = CacheOptimizer(self.cache)
         self.push_scheduler = PushScheduler(self.push_engine)
 
-        # 初始化Fetcher（复用v1）
-        pubmed_email = os.getenv("PUBMED_EMAIL", "ontarget@example.com")
-        self.fetcher = PaperFetcher(pubmed_email)
-        self.impact_factor_fetcher = ImpactFactorFetcher()
-
         # 系统配置
         self.default_days_back = int(os.getenv("UPDATE_INTERVAL_DAYS", "7"))
         self.default_score_threshold = float(os.getenv("SCORE_THRESHOLD", "0.3"))
 
+    @cached_property
+    def fetcher(self):
+        """文献获取器（复用v1，首次使用时创建）"""
+        from v1.fetcher import PaperFetcher
+
+        pubmed_email = os.getenv("PUBMED_EMAIL", "ontarget@example.com")
+        return PaperFetcher(pubmed_email)
+
+    @cached_property
+    def impact_factor_fetcher(self):
+        """影响因子查询器（复用v1，首次使用时创建）"""
+        from v1.impact_factor import ImpactFactorFetcher
+
+        return ImpactFactorFetcher()
+
     def get_user_analyzer(self, user_id: str) -> OptimizedAnalyzer:
         """获取用户专属的分析器（使用用户的API配置，自动解密）"""
         user = self.user_manager.get_user(user_id)
@@ -149,6 +180,8 @@ class LiteraturePushSystemV2:
         user_sources = self.user_manager.get_user_sources(user_id)
 
         # 使用关键词组系统获取所有关键词
+        from models.keyword_group_manager import KeywordGroupManager
+
         kg_manager = KeywordGroupManager(self.db_path)
         user_groups = kg_manager.get_user_groups(user_id)
 
@@ -162,7 +195,7 @@ class LiteraturePushSystemV2:
             user_keywords = []
             for group in user_groups:
                 user_keywords.extend(group.get("keywords", []))
-            user_keywords = list(set(user_keywords))  # 去重
+            user_keywords = list(dict.fromkeys(user_keywords))  # 去重（保持顺序）
 
         if not user_keywords:
             return {"success": False, "error": "用户未设置关键词"}
@@ -202,15 +235,6 @@ class LiteraturePushSystemV2:
                 result["fetched"] = len(papers)
                 print(f"✓ 获取到 {len(papers)} 篇文献")
 
-                # 将 datetime 对象转换为字符串以便 JSON 序列化
-                for paper in papers:
-                    if "publication_date" in paper and hasattr(
-                        paper["publication_date"], "isoformat"
-                    ):
-                        paper["publication_date"] = paper[
-                            "publication_date"
-                        ].isoformat()
-
                 # 缓存搜索结果 - 批量缓存到SQLite数据库
                 paper_hashes = []
                 current_time = datetime.now().isoformat()
@@ -232,6 +256,14 @@ class LiteraturePushSystemV2:
                 # 保存搜索结果到数据库
                 self.cache.cache_search_results(user_keywords, days_back, paper_hashes)
 
+            # 没有任何文献时，评分、影响因子、分析和推送都是空操作，直接返回
+            if not papers:
+                print("✓ 没有新文献，跳过评分、分析和推送")
+                self.user_manager.update_user_stats(
+                    user_id, {"last_paper_fetch": datetime.now().isoformat()}
+                )
+                return result
+
             # 3. 关键词评分
             print("\n[3/5] 关键词评分...")
             scored_papers = scorer.score_papers(papers, user_keywords)
@@ -249,6 +281,8 @@ class LiteraturePushSystemV2:
             try:
                 from models.database import Paper
 
+                # 同一次提交内的更新共用一个时间戳
+                now = datetime.now()
                 for paper in scored_papers:
                     paper_hash = paper.get("hash")
                     if paper_hash:
@@ -257,7 +291,7 @@ class LiteraturePushSystemV2:
                         )
                         if db_paper:
                             db_paper.score = paper["keywords_score"]
-                            db_paper.updated_at = datetime.now()
+                            db_paper.updated_at = now
                 db.commit()
             finally:
                 db.close()
@@ -277,18 +311,35 @@ class LiteraturePushSystemV2:
             print("  保存影响因子到缓存...")
             db = self.cache._get_session()
             try:
+                from sqlalchemy import bindparam, func, update
                 from models.database import Paper
 
-                for paper in papers_with_if:
-                    paper_hash = paper.get("hash")
-                    if paper_hash:
-                        db_paper = (
-                            db.query(Paper).filter(Paper.id == paper_hash).first()
-                        )
-                        if db_paper:
-                            db_paper.impact_factor = paper.get("impact_factor")
-                            db_paper.journal = paper.get("journal", db_paper.journal)
-                            db_paper.updated_at = datetime.now()
+                # 直接 UPDATE，缺失的期刊名由 COALESCE 保留原值，无需先 SELECT
+                papers_table = Paper.__table__
+                update_if_stmt = (
+                    update(papers_table)
+                    .where(papers_table.c.id == bindparam("b_id"))
+                    .values(
+                        impact_factor=bindparam("b_impact_factor"),
+                        journal=func.coalesce(
+                            bindparam("b_journal"), papers_table.c.journal
+                        ),
+                        updated_at=bindparam("b_updated_at"),
+                    )
+                )
+                now = datetime.now()
+                update_params = [
+                    {
+                        "b_id": paper["hash"],
+                        "b_impact_factor": paper.get("impact_factor"),
+                        "b_journal": paper.get("journal"),
+                        "b_updated_at": now,
+                    }
+                    for paper in papers_with_if
+                    if paper.get("hash")
+                ]
+                if update_params:
+                    db.execute(update_if_stmt, update_params)
                 db.commit()
             finally:
                 db.close()
@@ -311,9 +362,22 @@ class LiteraturePushSystemV2:
             papers_to_analyze = []
 
             for paper in papers_with_if:
-                cached_analysis = self.cache.get_cached_analysis(
-                    paper.get("title", ""), paper.get("abstract", "")
-                )
+                title = paper.get("title", "")
+                abstract = paper.get("abstract", "") or ""
+
+                # 摘要过短的文献不会被自动分析，跳过分析缓存查询
+                if not (title and len(abstract) > 50):
+                    if not paper.get("is_analyzed"):
+                        paper["is_analyzed"] = False
+                        paper["main_findings"] = ""
+                        paper["innovations"] = ""
+                        paper["limitations"] = ""
+                        paper["future_directions"] = ""
+                        paper["abstract_cn"] = ""
+                    all_papers.append(paper)
+                    continue
+
+                cached_analysis = self.cache.get_cached_analysis(title, abstract)
 
                 if cached_analysis:
                     paper.update(cached_analysis)
@@ -333,6 +397,26 @@ class LiteraturePushSystemV2:
 
             # 自动分析未缓存的文献
             if papers_to_analyze and user_analyzer:
+
+                # 确保值为字符串
+                def to_str(v):
+                    if v is None:
+                        return ""
+                    if isinstance(v, (tuple, list)):
+                        return to_str(v[0]) if v else ""
+                    if isinstance(v, dict):
+                        for k in [
+                            "main_findings",
+                            "innovations",
+                            "limitations",
+                            "future_directions",
+                        ]:
+                            if k in v and v[k]:
+                                return to_str(v[k])
+                        return str(v)
+                    return str(v) if v else ""
+
+                analyze_total = min(len(papers_to_analyze), max_auto_analyze)
                 analyze_count = 0
                 for paper in papers_to_analyze:
                     if analyze_count >= max_auto_analyze:
@@ -347,62 +431,32 @@ class LiteraturePushSystemV2:
                         analysis = user_analyzer.analyze_paper(title, abstract)
 
                         if analysis and not analysis.get("error"):
-                            # 翻译摘要（使用用户专属分析器）
-                            abstract_cn = (
-                                user_analyzer.translate_abstract(abstract)
-                                if len(abstract) > 50
-                                else ""
-                            )
-
-                            # 确保值为字符串
-                            def to_str(v):
-                                if v is None:
-                                    return ""
-                                if isinstance(v, (tuple, list)):
-                                    return to_str(v[0]) if v else ""
-                                if isinstance(v, dict):
-                                    for k in [
-                                        "main_findings",
-                                        "innovations",
-                                        "limitations",
-                                        "future_directions",
-                                    ]:
-                                        if k in v and v[k]:
-                                            return to_str(v[k])
-                                    return str(v)
-                                return str(v) if v else ""
+                            # 翻译摘要（使用用户专属分析器，摘要长度已在上面检查）
+                            abstract_cn = user_analyzer.translate_abstract(abstract)
+
+                            analysis_fields = {
+                                "main_findings": to_str(analysis.get("main_findings", "")),
+                                "innovations": to_str(analysis.get("innovations", "")),
+                                "limitations": to_str(analysis.get("limitations", "")),
+                                "future_directions": to_str(
+                                    analysis.get("future_directions", "")
+                                ),
+                                "abstract_cn": (
+                                    to_str(abstract_cn)
+                                    if not abstract_cn.startswith("翻译失败")
+                                    else ""
+                                ),
+                            }
 
                             # 更新paper对象
-                            paper["main_findings"] = to_str(
-                                analysis.get("main_findings", "")
-                            )
-                            paper["innovations"] = to_str(
-                                analysis.get("innovations", "")
-                            )
-                            paper["limitations"] = to_str(
-                                analysis.get("limitations", "")
-                            )
-                            paper["future_directions"] = to_str(
-                                analysis.get("future_directions", "")
-                            )
-                            paper["abstract_cn"] = (
-                                to_str(abstract_cn)
-                                if not abstract_cn.startswith("翻译失败")
-                                else ""
-                            )
+                            paper.update(analysis_fields)
                             paper["is_analyzed"] = True
 
                             # 缓存分析结果
                             self.cache.cache_analysis(
                                 title,
                                 abstract,
-                                {
-                                    "main_findings": paper["main_findings"],
-                                    "innovations": paper["innovations"],
-                                    "limitations": paper["limitations"],
-                                    "future_directions": paper["future_directions"],
-                                    "abstract_cn": paper["abstract_cn"],
-                                },
+                                analysis_fields,
                                 paper_hash=paper.get("hash"),
                             )
 
@@ -411,7 +465,7 @@ class LiteraturePushSystemV2:
 
                             if analyze_count % 5 == 0:
                                 print(
-                                    f"  - 已分析 {analyze_count}/{min(len(papers_to_analyze), max_auto_analyze)} 篇..."
+                                    f"  - 已分析 {analyze_count}/{analyze_total} 篇..."
                                 )
 
             print(f"  - 已缓存分析: {cached_count} 篇")
@@ -470,17 +524,68 @@ class LiteraturePushSystemV2:
 
         return result
 
+    @staticmethod
+    def _paper_search_text(paper: Dict) -> str:
+        """生成文献的小写检索文本（标题 + 摘要）"""
+        return f"{paper.get('title') or ''} {paper.get('abstract') or ''}".lower()
+
     def _extract_matched_keywords(
-        self, paper: Dict, user_keywords: List[str]
+        self, paper: Dict, user_keywords: List[str], text: str = None
     ) -> List[str]:
-        """提取文献匹配的关键词"""
-        text = f"{paper.get('title', '')} {paper.get('abstract', '')}".lower()
+        """提取文献匹配的关键词（可传入预先生成的检索文本）"""
+        if text is None:
+            text = self._paper_search_text(paper)
         matched = []
         for kw in user_keywords:
             if kw.lower() in text:
                 matched.append(kw)
         return matched
 
+    def _build_paper_user_index(
+        self,
+        papers: List[Dict],
+        keyword_to_users: Dict[str, List[str]],
+        search_texts: List[str] = None,
+    ) -> List[set]:
+        """
+        建立 文献 -> 候选用户 的倒排索引
+
+        每篇文献的文本只扫描一次，命中的关键词再映射到订阅它的用户。
+        关键词变体与 PersonalizedPushEngine 的匹配规则一致，
+        因此这里得到的候选集合是推送结果的超集，不会漏掉文献。
+
+        Args:
+            papers: 文献列表
+            keyword_to_users: 小写关键词 -> 用户ID列表
+            search_texts: 与 papers 对齐的检索文本（可选，避免重复生成）
+
+        Returns:
+            与 papers 按位置对齐的用户ID集合列表
+        """
+        keyword_variants = [
+            ({kw, kw.replace("-", ""), kw.replace("-", " ")}, users)
+            for kw, users in keyword_to_users.items()
+        ]
+        # 所有关键词变体的首字符：文本中一个都不出现的文献不可能命中任何关键词
+        # （存在空变体时它能匹配任意文本，不做快速排除）
+        all_variants = [v for variants, _ in keyword_variants for v in variants]
+        first_chars = {v[0] for v in all_variants} if all(all_variants) else None
+
+        if search_texts is None:
+            search_texts = [
+                self._paper_search_text(paper) if paper else "" for paper in papers
+            ]
+
+        paper_to_users = []
+        for paper, text in zip(papers, search_texts):
+            candidates = set()
+            if paper and (first_chars is None or not first_chars.isdisjoint(text)):
+                for variants, users in keyword_variants:
+                    if any(variant in text for variant in variants):
+                        candidates.update(users)
+            paper_to_users.append(candidates)
+        return paper_to_users
+
     def run_batch_for_all_users(self, days_back: int = None) -> Dict:
         """
         为所有用户批量运行
@@ -517,16 +622,20 @@ class LiteraturePushSystemV2:
             print("没有活跃用户或关键词")
             return {"success": False, "error": "没有活跃用户"}
 
+        # 固定关键词顺序，保证分批搜索和缓存键在多次运行间一致
+        keyword_list = sorted(all_keywords)
+
         print(f"共 {len(self.user_manager.users)} 个用户")
-        print(f"合并后关键词: {len(all_keywords)} 个")
-        print(f"关键词: {', '.join(list(all_keywords)[:10])}...")
+        print(f"合并后关键词: {len(keyword_list)} 个")
+        print(f"关键词: {', '.join(keyword_list[:10])}...")
 
         # 2. 统一搜索（使用合并后的关键词）
         print("\n执行统一搜索...")
         all_papers = []
 
         # 检查缓存
-        cached_hashes = self.cache.get_cached_search(list(all_keywords), days_back)
+        cached_hashes = self.cache.get_cached_search(keyword_list, days_back)
+        search_texts = None
 
         if cached_hashes:
             print(f"✓ 使用缓存的搜索结果 ({len(cached_hashes)} 篇)")
@@ -536,7 +645,6 @@ class LiteraturePushSystemV2:
                 return {"success": False, "error": "PubMed邮箱未配置"}
 
             # 分批搜索避免请求过大
-            keyword_list = list(all_keywords)
             batch_size = 10
 
             for i in range(0, len(keyword_list), batch_size):
@@ -546,32 +654,33 @@ class LiteraturePushSystemV2:
                 papers = self.fetcher.fetch_all(batch, days_back)
                 all_papers.extend(papers)
 
-            # 去重
-            seen = set()
-            unique_papers = []
+            # 去重（按 DOI 或小写标题，保留首次出现的文献）
+            unique_papers = {}
             for paper in all_papers:
                 key = paper.get("doi") or paper.get("title", "").lower()
-                if key and key not in seen:
-                    seen.add(key)
-                    unique_papers.append(paper)
+                if key:
+                    unique_papers.setdefault(key, paper)
 
-            all_papers = unique_papers
+            all_papers = list(unique_papers.values())
             print(f"✓ 共获取 {len(all_papers)} 篇唯一文献")
 
+            # 每篇文献的小写检索文本只生成一次，关键词索引和个性化推送共用
+            search_texts = [self._paper_search_text(paper) for paper in all_papers]
+
             # 缓存所有文献
             paper_hashes = []
-            for paper in all_papers:
+            for paper, text in zip(all_papers, search_texts):
                 paper_hash = self.cache.cache_paper(paper)
                 paper_hashes.append(paper_hash)
 
                 # 索引关键词
                 matched_keywords = self._extract_matched_keywords(
-                    paper, list(all_keywords)
+                    paper, keyword_list, text
                 )
                 self.cache.index_paper_keywords(paper_hash, matched_keywords)
 
             # 缓存搜索结果
-            self.cache.cache_search_results(list(all_keywords), days_back, paper_hashes)
+            self.cache.cache_search_results(keyword_list, days_back, paper_hashes)
 
         # 3. 统一分析（所有用户共享分析结果）
         print("\n执行统一分析...")
@@ -630,6 +739,11 @@ class LiteraturePushSystemV2:
         print("\n为用户生成个性化推送...")
         results = {}
 
+        # 每篇文献只扫描一次，之后每个用户只对命中其关键词的文献评分
+        paper_to_users = self._build_paper_user_index(
+            all_papers, keyword_to_users, search_texts
+        )
+
         for user_id, user in self.user_manager.users.items():
             if not user.get("is_active", True):
                 continue
@@ -638,8 +752,13 @@ class LiteraturePushSystemV2:
             if not user_keywords:
                 continue
 
+            candidate_papers = [
+                paper
+                for paper, users in zip(all_papers, paper_to_users)
+                if user_id in users
+            ]
             personalized = self.push_engine.get_personalized_papers(
-                user_id, user_keywords, all_papers, limit=20
+                user_id, user_keywords, candidate_papers, limit=20
             )
 
             results[user_id] = {
@@ -649,7 +768,8 @@ class LiteraturePushSystemV2:
 
             if personalized:
                 paper_hashes = [
-                    p.get("hash", hash(p.get("title", ""))) for p in personalized
+                    p["hash"] if "hash" in p else hash(p.get("title", ""))
+                    for p in personalized
                 ]
                 self.push_engine.record_push(user_id, paper_hashes, "batch")
 
@@ -3,63 +3,163 @@
 数据库适配器 - 让simple_db兼容SQLAlchemy风格API
 """
 
-import json
+import threading
 from datetime import datetime, timedelta
+from cachetools import LRUCache
 from models.simple_db import get_db
+from utils.json_utils import json_dumps, json_loads
+
+# (查询列, 表名, 过滤列) -> SQL 语句，同一查询形状只拼接一次
+_FILTER_SQL_CACHE = {}
+_COUNT_SQL_CACHE = {}
+_SCALARS_SQL_CACHE = {}
+_FIRST_ID_SQL_CACHE = {}
+# (表名, 修改的列) -> 按列 UPDATE 语句
+_UPDATE_SQL_CACHE = {}
+
+def _filter_sql(cache, select, table_name, columns, suffix=''):
+    """获取（必要时构建并缓存）带 WHERE 条件的 SQL"""
+    key = (select, table_name, columns)
+    sql = cache.get(key)
+    if sql is None:
+        sql = f"SELECT {select} FROM {table_name}"
+        if columns:
+            sql += " WHERE " + " AND ".join(f"{col} = ?" for col in columns)
+        sql += suffix
+        cache[key] = sql
+    return sql
+
+# 单条 IN 查询的最大参数个数（低于 SQLite 默认 SQLITE_MAX_VARIABLE_NUMBER=999）
+_IN_CHUNK_SIZE = 900
+
+# 参数个数 -> "?,?,...,?" 占位符串
+_PLACEHOLDERS_CACHE = {}
+
+def _placeholders(n):
+    """获取（必要时构建并缓存）n 个参数的占位符串"""
+    placeholders = _PLACEHOLDERS_CACHE.get(n)
+    if placeholders is None:
+        placeholders = _PLACEHOLDERS_CACHE[n] = ','.join('?' * n)
+    return placeholders
+
+# getattr 的缺省哨兵（区分“列不存在”和“值为 None”）
+_MISSING = object()
+
+# 各表需要转换为 bool 的列
+_TABLE_BOOL_COLS = {
+    'users': ('is_active', 'is_admin'),
+    'keyword_groups': ('is_active',),
+    'papers': ('is_analyzed',),
+    'user_papers': ('is_saved', 'is_viewed'),
+}
+
+# (表名, 列名, 原始 JSON 字符串) -> (解析结果, 是否为单层容器)
+# 同一行被反复读取时不再重复解析 JSON
+_JSON_PARSE_CACHE = LRUCache(maxsize=4096)
+_json_parse_lock = threading.Lock()
+
+def _copy_json(value):
+    """递归复制 JSON 解析结果，避免调用方修改污染缓存"""
+    if isinstance(value, dict):
+        return {k: _copy_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_json(v) for v in value]
+    return value
+
+def _parse_json_column(table_name, field, raw, default):
+    """解析 JSON 列（带缓存），返回可安全修改的副本"""
+    key = (table_name, field, raw)
+    with _json_parse_lock:
+        entry = _JSON_PARSE_CACHE.get(key)
+    if entry is None:
+        try:
+            value = json_loads(raw)
+        except ValueError:
+            return default()
+        if isinstance(value, dict):
+            flat = not any(isinstance(v, (dict, list)) for v in value.values())
+        elif isinstance(value, list):
+            flat = not any(isinstance(v, (dict, list)) for v in value)
+        else:
+            flat = True
+        entry = (value, flat)
+        with _json_parse_lock:
+            _JSON_PARSE_CACHE[key] = entry
+    
+    value, flat = entry
+    if not isinstance(value, (dict, list)):
+        return value
+    # 单层容器（如关键词/作者列表）浅拷贝即可
+    return value.copy() if flat else _copy_json(value)
+
+class _LazyJSON:
+    """JSON 列描述符：保存原始字符串，首次访问时才解析（解析结果缓存在实例上）"""
+    
+    def __init__(self, default):
+        # 解析失败时的默认值工厂
+        self.default = default
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.raw_name = '_raw_' + name
+        self.table_name = owner.__tablename__
+    
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = getattr(instance, self.raw_name)
+        if isinstance(value, str):
+            value = _parse_json_column(self.table_name, self.name, value, self.default)
+            setattr(instance, self.raw_name, value)
+        elif value is None:
+            # 空列同样规范化为默认容器，调用方可直接原地修改
+            value = self.default()
+            setattr(instance, self.raw_name, value)
+        return value
+    
+    def __set__(self, instance, value):
+        setattr(instance, self.raw_name, value)
 
 class QueryWrapper:
     """查询包装器，模拟SQLAlchemy查询"""
     
-    def __init__(self, table_name):
+    def __init__(self, table_name, session=None):
         self.table_name = table_name
         self.db = get_db()
+        # 所属会话：加载的对象登记到会话中，commit 时自动写回被修改的对象
+        self._session = session
         self.filters = []
         self._limit = None
+        self._offset = None
         self._order_by = None
+        self._where_columns = ()
+        self._where_params = ()
+        self._query = None
+        self._params = ()
+        self._in_column = None
+        self._in_values = ()
+        # 模型类和每行的后处理列在构造时确定一次
+        self._model_class = _MODEL_MAP.get(table_name)
+        self._bool_cols = _TABLE_BOOL_COLS.get(table_name, ())
     
-    def _dict_to_object(self, data):
-        """将字典转换为模型对象"""
-        if data is None:
+    def _dict_to_object(self, row):
+        """将查询行（sqlite3.Row）转换为模型对象"""
+        if row is None:
             return None
         
-        # 表名到模型类的映射（延迟导入避免循环依赖）
-        model_map = {
-            'users': User,
-            'sessions': Session,
-            'keyword_groups': KeywordGroup,
-            'papers': Paper,
-            'search_cache': SearchCache,
-            'analysis_cache': AnalysisCache,
-            'keyword_index': KeywordIndex,
-            'group_saved_papers': GroupSavedPaper,
-            'group_viewed_papers': GroupViewedPaper,
-            'user_papers': UserPaper,
-        }
-        
-        model_class = model_map.get(self.table_name)
+        model_class = self._model_class
         if model_class:
-            # 处理特殊字段
-            if 'preferences' in data and isinstance(data['preferences'], str):
-                try:
-                    data['preferences'] = json.loads(data['preferences'])
-                except:
-                    data['preferences'] = {}
-            if 'keywords' in data and isinstance(data['keywords'], str):
-                try:
-                    data['keywords'] = json.loads(data['keywords'])
-                except:
-                    data['keywords'] = []
-            if 'authors' in data and isinstance(data['authors'], str):
-                try:
-                    data['authors'] = json.loads(data['authors'])
-                except:
-                    data['authors'] = []
+            # JSON 列由 _LazyJSON 在首次访问时解析
+            obj = model_class.from_row(row)
             # 处理布尔值
-            for field in ['is_active', 'is_admin', 'is_analyzed', 'is_saved', 'is_viewed']:
-                if field in data:
-                    data[field] = bool(data[field])
-            return model_class(**data)
-        return data
+            for field in self._bool_cols:
+                value = getattr(obj, field, _MISSING)
+                if value is not _MISSING:
+                    setattr(obj, field, bool(value))
+            if self._session is not None and obj._tracked_columns:
+                self._session._track(obj)
+            return obj
+        return dict(row)
     
     def filter(self, condition):
         """添加过滤条件"""
@@ -69,51 +169,79 @@ class QueryWrapper:
     def filter_by(self, **kwargs):
         """通过关键字过滤"""
         # 累积过滤条件，而不是覆盖
-        if not hasattr(self, '_where_clauses'):
-            self._where_clauses = []
-            self._where_params = []
-        
-        for key, value in kwargs.items():
-            self._where_clauses.append(f"{key} = ?")
-            self._where_params.append(value)
-        
-        # 构建完整查询
-        query = f"SELECT * FROM {self.table_name}"
-        if self._where_clauses:
-            query += " WHERE " + " AND ".join(self._where_clauses)
+        self._where_columns += tuple(kwargs)
+        self._where_params += tuple(kwargs.values())
         
-        self._query = query
+        # 查询语句按 (表名, 过滤列) 缓存
+        self._query = _filter_sql(_FILTER_SQL_CACHE, '*', self.table_name, self._where_columns)
         self._params = self._where_params
         return self
     
+    def in_(self, column, values):
+        """IN 过滤：column IN (values)，查询时按块拆分以避开 SQLite 参数个数上限"""
+        self._in_column = column
+        self._in_values = list(values)
+        return self
+    
+    def _fetch_in_chunks(self):
+        """分块执行 IN 查询（与 filter_by 条件叠加）"""
+        base = _filter_sql(_FILTER_SQL_CACHE, '*', self.table_name, self._where_columns)
+        base += " AND " if self._where_columns else " WHERE "
+        rows = []
+        values = self._in_values
+        for i in range(0, len(values), _IN_CHUNK_SIZE):
+            chunk = values[i:i + _IN_CHUNK_SIZE]
+            query = f"{base}{self._in_column} IN ({_placeholders(len(chunk))})"
+            rows.extend(self.db.fetchall_rows(query, (*self._where_params, *chunk)))
+        return rows
+    
+    def _ordered(self, query, params):
+        """附加 ORDER BY / LIMIT / OFFSET（分页参数绑定传入）"""
+        if self._order_by:
+            query += f" ORDER BY {self._order_by}"
+        if self._limit is not None or self._offset:
+            query += " LIMIT ? OFFSET ?"
+            params = (*params, -1 if self._limit is None else self._limit, self._offset or 0)
+        return query, params
+    
     def first(self):
         """获取第一条记录"""
-        if hasattr(self, '_query'):
-            result = self.db.fetchone(self._query, self._params)
-            return self._dict_to_object(result)
+        if self._query is not None:
+            row = self.db.fetchone_row(*self._ordered(self._query, self._params))
+            return self._dict_to_object(row)
         return None
     
     def all(self):
         """获取所有记录"""
-        if hasattr(self, '_query'):
-            results = self.db.fetchall(self._query, self._params)
+        if self._in_column is not None:
+            rows = self._fetch_in_chunks()
+        elif self._query is not None:
+            rows = self.db.fetchall_rows(*self._ordered(self._query, self._params))
         else:
-            results = self.db.fetchall(f"SELECT * FROM {self.table_name}")
-        return [self._dict_to_object(r) for r in results]
+            rows = self.db.fetchall_rows(*self._ordered(f"SELECT * FROM {self.table_name}", ()))
+        return [self._dict_to_object(r) for r in rows]
+    
+    def scalars(self, column):
+        """只查询单列，直接返回值列表（不构造模型对象）"""
+        query = _filter_sql(_SCALARS_SQL_CACHE, column, self.table_name, self._where_columns)
+        return self.db.fetchcol(query, self._where_params)
+    
+    def ids(self):
+        """获取符合条件记录的 id 列表"""
+        return self.scalars('id')
     
     def count(self):
         """获取记录数"""
-        if hasattr(self, '_where_clauses') and self._where_clauses:
-            # 使用过滤条件
-            query = f"SELECT COUNT(*) as count FROM {self.table_name} WHERE " + " AND ".join(self._where_clauses)
-            result = self.db.fetchone(query, self._where_params)
-        else:
-            # 无过滤条件
-            result = self.db.fetchone(f"SELECT COUNT(*) as count FROM {self.table_name}")
-        return result['count'] if result else 0
+        query = _filter_sql(_COUNT_SQL_CACHE, 'COUNT(*)', self.table_name, self._where_columns)
+        return self.db.fetchscalar(query, self._where_params) or 0
+    
+    def first_id(self):
+        """获取第一条记录的 id（不构造模型对象），无记录时返回 None"""
+        query = _filter_sql(_FIRST_ID_SQL_CACHE, 'id', self.table_name, self._where_columns, ' LIMIT 1')
+        return self.db.fetchscalar(query, self._where_params)
     
     def order_by(self, column):
-        """排序"""
+        """排序（列名，可带 ASC/DESC，如 "created_at DESC"）"""
         self._order_by = column
         return self
     
@@ -121,6 +249,11 @@ class QueryWrapper:
         """限制结果数"""
         self._limit = n
         return self
+    
+    def offset(self, n):
+        """跳过前 n 条记录"""
+        self._offset = n
+        return self
 
 def get_db_session(db_path=None):
     """获取数据库会话（兼容函数）"""
@@ -132,49 +265,47 @@ class DBSession:
     def __init__(self, db_path=None):
         self.db = get_db(db_path)
         self._pending = []
+        # 查询加载的对象及其加载时的列快照（用于 commit 时检测修改）
+        self._loaded = []
     
     def query(self, model_class):
         """创建查询"""
-        if isinstance(model_class, str):
-            table_name = model_class
-        elif hasattr(model_class, '__tablename__'):
-            table_name = model_class.__tablename__
-        elif model_class.__name__ == 'User':
-            table_name = 'users'
-        elif model_class.__name__ == 'Session':
-            table_name = 'sessions'
-        elif model_class.__name__ == 'KeywordGroup':
-            table_name = 'keyword_groups'
-        elif model_class.__name__ == 'Paper':
-            table_name = 'papers'
-        elif model_class.__name__ == 'SearchCache':
-            table_name = 'search_cache'
-        elif model_class.__name__ == 'AnalysisCache':
-            table_name = 'analysis_cache'
-        elif model_class.__name__ == 'KeywordIndex':
-            table_name = 'keyword_index'
-        elif model_class.__name__ == 'GroupSavedPaper':
-            table_name = 'group_saved_papers'
-        elif model_class.__name__ == 'GroupViewedPaper':
-            table_name = 'group_viewed_papers'
-        elif model_class.__name__ == 'UserPaper':
-            table_name = 'user_papers'
-        else:
-            table_name = model_class.__name__.lower() + 's'
-        
-        return QueryWrapper(table_name)
+        return QueryWrapper(_resolve_table_name(model_class), session=self)
     
     def add(self, obj):
         """添加对象"""
         self._pending.append(obj)
     
+    def _track(self, obj):
+        """登记查询加载的对象（相当于 SQLAlchemy 的 identity map + 脏检查）"""
+        self._loaded.append((obj, obj._snapshot()))
+    
     def commit(self):
         """提交事务"""
-        # 保存待处理的对象
+        # 按模型类型分桶，每类一条语句 executemany，所有对象在同一事务中写入
+        batches = {}
         for obj in self._pending:
-            if hasattr(obj, 'save'):
+            if hasattr(obj, '_to_row'):
+                batches.setdefault(obj._upsert_sql, []).append(obj._to_row())
+            elif hasattr(obj, 'save'):
                 obj.save()
+        
+        # 已加载对象只写回与快照不同的列（包括 JSON 列的原地修改），无需重新赋值或 add；
+        # 只读不改的对象不写库，避免用旧值覆盖其他会话的提交
+        pending_ids = {id(obj) for obj in self._pending}
+        for obj, snapshot in self._loaded:
+            if id(obj) in pending_ids:
+                continue
+            changed = obj._changed_columns(snapshot)
+            if changed:
+                params = [obj._column_db_value(col) for col in changed]
+                params.append(obj.id)
+                batches.setdefault(_update_sql(obj.__tablename__, changed), []).append(params)
+        
+        if batches:
+            self.db.execute_batch(batches.items())
         self._pending = []
+        self._loaded = [(obj, obj._snapshot()) for obj, _ in self._loaded]
     
     def flush(self):
         """刷新会话（立即保存所有修改）"""
@@ -183,50 +314,147 @@ class DBSession:
     def rollback(self):
         """回滚事务"""
         self._pending = []
+        self._loaded = []
     
     def close(self):
         """关闭会话"""
         self._pending = []
+        self._loaded = []
     
     def delete(self, obj):
         """删除对象"""
-        from models.simple_db import get_db
         db = get_db()
         
         # 根据对象类型确定表名和ID字段
-        if hasattr(obj, '__tablename__'):
-            table_name = obj.__tablename__
-        elif obj.__class__.__name__ == 'User':
-            table_name = 'users'
-        elif obj.__class__.__name__ == 'Session':
-            table_name = 'sessions'
-        elif obj.__class__.__name__ == 'KeywordGroup':
-            table_name = 'keyword_groups'
-        elif obj.__class__.__name__ == 'Paper':
-            table_name = 'papers'
-        elif obj.__class__.__name__ == 'SearchCache':
-            table_name = 'search_cache'
-        elif obj.__class__.__name__ == 'AnalysisCache':
-            table_name = 'analysis_cache'
-        elif obj.__class__.__name__ == 'KeywordIndex':
-            table_name = 'keyword_index'
-        elif obj.__class__.__name__ == 'GroupSavedPaper':
-            table_name = 'group_saved_papers'
-        elif obj.__class__.__name__ == 'GroupViewedPaper':
-            table_name = 'group_viewed_papers'
-        elif obj.__class__.__name__ == 'UserPaper':
-            table_name = 'user_papers'
-        else:
-            table_name = obj.__class__.__name__.lower() + 's'
+        table_name = _resolve_table_name(type(obj))
         
         # 执行删除
         obj_id = getattr(obj, 'id', None)
         if obj_id:
             db.execute(f"DELETE FROM {table_name} WHERE id = ?", (obj_id,))
+        # 已删除的对象不再参与 commit 时的修改检测
+        self._loaded = [(o, snapshot) for o, snapshot in self._loaded if o is not obj]
+
+def _to_iso(value, default=None):
+    """将 datetime 转换为 ISO 字符串（字符串原样返回，空值返回 default）"""
+    if isinstance(value, str):
+        return value
+    if value is None:
+        return default
+    return value.isoformat() if hasattr(value, 'isoformat') else default
+
+def _update_sql(table_name, columns):
+    """获取（必要时构建并缓存）按 id 更新指定列的 SQL"""
+    key = (table_name, columns)
+    sql = _UPDATE_SQL_CACHE.get(key)
+    if sql is None:
+        sets = ', '.join(f"{col} = ?" for col in columns)
+        sql = _UPDATE_SQL_CACHE[key] = f"UPDATE {table_name} SET {sets} WHERE id = ?"
+    return sql
+
+def _json_value(raw):
+    """JSON 列的比较值：原始字符串解析后比较，避免格式差异（空格、转义）被当作修改"""
+    if isinstance(raw, str):
+        try:
+            return json_loads(raw)
+        except ValueError:
+            pass
+    return raw
+
+def _build_upsert_sql(table_name, columns, keep=()):
+    """构建 INSERT ... ON CONFLICT(id) DO UPDATE 语句（keep 中的列冲突时保留原值）"""
+    updates = ', '.join(f"{col} = excluded.{col}" for col in columns if col != 'id' and col not in keep)
+    return (f"INSERT INTO {table_name} ({', '.join(columns)}) "
+            f"VALUES ({_placeholders(len(columns))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}")
+
+# 写入语句（模块加载时构建一次），参数顺序与各模型 _to_row() 一致
+_USER_COLUMNS = ('id', 'username', 'email', 'password_hash', 'password_salt',
+                 'security_question', 'security_answer_hash', 'security_answer_salt',
+                 'is_active', 'is_admin', 'created_at', 'last_login', 'preferences', 'avatar')
+# 存在则更新（不覆盖 created_at），否则插入
+_UPSERT_USER_SQL = _build_upsert_sql('users', _USER_COLUMNS, keep=('created_at',))
+
+_KEYWORD_GROUP_COLUMNS = ('id', 'user_id', 'name', 'description', 'icon', 'color', 'keywords',
+                          'match_mode', 'min_match_score', 'is_active', 'created_at', 'updated_at')
+# 存在则更新（不覆盖 user_id/created_at），否则插入
+_UPSERT_KEYWORD_GROUP_SQL = _build_upsert_sql('keyword_groups', _KEYWORD_GROUP_COLUMNS,
+                                              keep=('user_id', 'created_at'))
+
+_SESSION_COLUMNS = ('id', 'user_id', 'created_at', 'expires_at', 'ip_address', 'user_agent')
+_UPSERT_SESSION_SQL = _build_upsert_sql('sessions', _SESSION_COLUMNS, keep=('user_id', 'created_at'))
+
+# 依赖 (group_id, paper_id) 主键去重
+_INSERT_GROUP_SAVED_SQL = 'INSERT OR IGNORE INTO group_saved_papers (group_id, paper_id, saved_at) VALUES (?, ?, ?)'
+_INSERT_GROUP_VIEWED_SQL = 'INSERT OR IGNORE INTO group_viewed_papers (group_id, paper_id, viewed_at) VALUES (?, ?, ?)'
+
+class _RowModel:
+    """模型基类：支持直接从查询行构造（子类用 __slots__ 声明表的列）"""
+    __slots__ = ()
+    
+    # 会话中参与修改检测的列（不含 id），为空则不登记到会话
+    _tracked_columns = ()
+    # 其中由 _LazyJSON 管理的 JSON 列
+    _json_columns = frozenset()
+    
+    def _snapshot(self):
+        """各跟踪列的当前值（JSON 列未解析时保留原始字符串，已解析时保存副本）"""
+        values = []
+        for col in self._tracked_columns:
+            if col in self._json_columns:
+                raw = getattr(self, '_raw_' + col)
+                values.append(raw if isinstance(raw, str) else _copy_json(raw))
+            else:
+                values.append(getattr(self, col, None))
+        return tuple(values)
+    
+    def _changed_columns(self, snapshot):
+        """与快照相比发生变化的列"""
+        changed = []
+        for col, old in zip(self._tracked_columns, snapshot):
+            if col in self._json_columns:
+                new = getattr(self, '_raw_' + col)
+                if new is not old and _json_value(new) != _json_value(old):
+                    changed.append(col)
+            elif getattr(self, col, None) != old:
+                changed.append(col)
+        return tuple(changed)
+    
+    def _column_db_value(self, col):
+        """列的写库值（JSON 列序列化，布尔转整数，datetime 转 ISO 字符串）"""
+        if col in self._json_columns:
+            raw = getattr(self, '_raw_' + col)
+            return raw if isinstance(raw, str) or raw is None else json_dumps(raw)
+        value = getattr(self, col, None)
+        if isinstance(value, bool):
+            return int(value)
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+    
+    @classmethod
+    def from_row(cls, row, keys=None):
+        """
+        从 sqlite3.Row 构造对象（跳过 __init__ 的 kwargs 解包和默认值处理）
+        
+        Args:
+            keys: 列名序列；row 为普通元组（如 JOIN 结果的切片）时必须提供
+        """
+        obj = cls.__new__(cls)
+        for key, value in zip(keys or row.keys(), row):
+            try:
+                setattr(obj, key, value)
+            except AttributeError:
+                # 表中存在模型未声明的列（如其他版本建表遗留），忽略
+                pass
+        return obj
 
 # 模型类定义（简化版）
-class User:
+class User(_RowModel):
     __tablename__ = 'users'
+    __slots__ = ('id', 'username', 'email', 'password_hash', 'password_salt', 'security_question',
+                 'security_answer_hash', 'security_answer_salt', 'is_active', 'is_admin', 'created_at',
+                 'last_login', '_raw_preferences', 'avatar')
+    
+    preferences = _LazyJSON(dict)
     
     def __init__(self, **kwargs):
         self.id = kwargs.get('id')
@@ -244,61 +472,35 @@ class User:
         self.preferences = kwargs.get('preferences', {})
         self.avatar = kwargs.get('avatar', '')
     
-    def save(self):
-        """保存到数据库"""
-        db = get_db()
-        preferences_json = json.dumps(self.preferences) if isinstance(self.preferences, dict) else self.preferences
-        
-        # 处理 last_login 字段
-        last_login_val = self.last_login
-        if isinstance(last_login_val, str):
-            last_login_val = last_login_val
-        elif hasattr(last_login_val, 'isoformat'):
-            last_login_val = last_login_val.isoformat()
-        else:
-            last_login_val = None
+    _upsert_sql = _UPSERT_USER_SQL
+    _tracked_columns = _USER_COLUMNS[1:]
+    _json_columns = frozenset(('preferences',))
+    
+    def _to_row(self):
+        """转换为 _upsert_sql 的参数元组"""
+        # 未被访问过的 JSON 列仍是原始字符串，直接写回，省去解析再序列化
+        preferences = self._raw_preferences
+        preferences_json = json_dumps(preferences) if isinstance(preferences, dict) else preferences
         
-        # 处理 created_at 字段
-        created_at_val = self.created_at
-        if isinstance(created_at_val, str):
-            created_at_val = created_at_val
-        elif hasattr(created_at_val, 'isoformat'):
-            created_at_val = created_at_val.isoformat()
-        else:
+        last_login_val = _to_iso(self.last_login)
+        created_at_val = _to_iso(self.created_at)
+        if created_at_val is None:
             created_at_val = datetime.now().isoformat()
         
-        # 检查是否存在
-        existing = db.fetchone("SELECT id FROM users WHERE id = ?", (self.id,))
-        
-        if existing:
-            # 更新
-            db.execute('''
-                UPDATE users SET 
-                    username = ?, email = ?, password_hash = ?, password_salt = ?,
-                    security_question = ?, security_answer_hash = ?, security_answer_salt = ?,
-                    is_active = ?, is_admin = ?, last_login = ?, preferences = ?, avatar = ?
-                WHERE id = ?
-            ''', (self.username, self.email, self.password_hash, self.password_salt,
-                  self.security_question, self.security_answer_hash, self.security_answer_salt,
-                  int(self.is_active), int(self.is_admin), 
-                  last_login_val,
-                  preferences_json, self.avatar or '', self.id))
-        else:
-            # 插入
-            db.execute('''
-                INSERT INTO users (id, username, email, password_hash, password_salt,
-                    security_question, security_answer_hash, security_answer_salt,
-                    is_active, is_admin, created_at, last_login, preferences, avatar)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (self.id, self.username, self.email, self.password_hash, self.password_salt,
-                  self.security_question, self.security_answer_hash, self.security_answer_salt,
-                  int(self.is_active), int(self.is_admin),
-                  created_at_val,
-                  last_login_val,
-                  preferences_json, self.avatar or ''))
-
-class Session:
+        return (self.id, self.username, self.email, self.password_hash, self.password_salt,
+                self.security_question, self.security_answer_hash, self.security_answer_salt,
+                int(self.is_active), int(self.is_admin),
+                created_at_val,
+                last_login_val,
+                preferences_json, self.avatar or '')
+    
+    def save(self):
+        """保存到数据库"""
+        get_db().execute(self._upsert_sql, self._to_row())
+
+class Session(_RowModel):
     __tablename__ = 'sessions'
+    __slots__ = ('id', 'user_id', 'created_at', 'expires_at', 'ip_address', 'user_agent')
     
     def __init__(self, **kwargs):
         self.id = kwargs.get('id')
@@ -307,9 +509,25 @@ class Session:
         self.expires_at = kwargs.get('expires_at')
         self.ip_address = kwargs.get('ip_address')
         self.user_agent = kwargs.get('user_agent')
+    
+    _upsert_sql = _UPSERT_SESSION_SQL
+    _tracked_columns = _SESSION_COLUMNS[1:]
+    
+    def _to_row(self):
+        """转换为 _upsert_sql 的参数元组"""
+        return (self.id, self.user_id, _to_iso(self.created_at), _to_iso(self.expires_at),
+                self.ip_address, self.user_agent)
+    
+    def save(self):
+        """保存到数据库"""
+        get_db().execute(self._upsert_sql, self._to_row())
 
-class KeywordGroup:
+class KeywordGroup(_RowModel):
     __tablename__ = 'keyword_groups'
+    __slots__ = ('id', 'user_id', 'name', 'description', 'icon', 'color', '_raw_keywords', 'match_mode',
+                 'min_match_score', 'is_active', 'created_at', 'updated_at')
+    
+    keywords = _LazyJSON(list)
     
     def __init__(self, **kwargs):
         self.id = kwargs.get('id')
@@ -325,132 +543,131 @@ class KeywordGroup:
         self.created_at = kwargs.get('created_at')
         self.updated_at = kwargs.get('updated_at')
     
+    _upsert_sql = _UPSERT_KEYWORD_GROUP_SQL
+    _tracked_columns = _KEYWORD_GROUP_COLUMNS[1:]
+    _json_columns = frozenset(('keywords',))
+    
+    def _to_row(self):
+        """转换为 _upsert_sql 的参数元组"""
+        keywords = self._raw_keywords
+        keywords_json = json_dumps(keywords) if isinstance(keywords, list) else keywords
+        now_iso = datetime.now().isoformat()
+        
+        return (self.id, self.user_id, self.name, self.description, self.icon, self.color, keywords_json,
+                self.match_mode, self.min_match_score, int(self.is_active),
+                _to_iso(self.created_at, now_iso),
+                _to_iso(self.updated_at, now_iso))
+    
     def save(self):
         """保存到数据库"""
-        from models.simple_db import get_db
-        import json
-        db = get_db()
-        
-        keywords_json = json.dumps(self.keywords) if isinstance(self.keywords, list) else self.keywords
-        
-        existing = db.fetchone("SELECT id FROM keyword_groups WHERE id = ?", (self.id,))
-        
-        if existing:
-            # 更新
-            db.execute('''
-                UPDATE keyword_groups SET
-                    name = ?, description = ?, icon = ?, color = ?, keywords = ?,
-                    match_mode = ?, min_match_score = ?, is_active = ?, updated_at = ?
-                WHERE id = ?
-            ''', (self.name, self.description, self.icon, self.color, keywords_json,
-                  self.match_mode, self.min_match_score, int(self.is_active),
-                  self.updated_at.isoformat() if self.updated_at else datetime.now().isoformat(),
-                  self.id))
-        else:
-            # 插入
-            db.execute('''
-                INSERT INTO keyword_groups (id, user_id, name, description, icon, color, keywords,
-                    match_mode, min_match_score, is_active, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (self.id, self.user_id, self.name, self.description, self.icon, self.color, keywords_json,
-                  self.match_mode, self.min_match_score, int(self.is_active),
-                  self.created_at.isoformat() if self.created_at else datetime.now().isoformat(),
-                  self.updated_at.isoformat() if self.updated_at else datetime.now().isoformat()))
-
-class Paper:
+        get_db().execute(self._upsert_sql, self._to_row())
+
+class Paper(_RowModel):
     __tablename__ = 'papers'
+    __slots__ = ('id', 'title', 'abstract', 'abstract_cn', '_raw_authors', 'journal', 'pub_date', 'doi',
+                 'pmid', 'url', 'source', 'main_findings', 'innovations', 'limitations',
+                 'future_directions', 'is_analyzed', 'impact_factor', 'citations', 'score', 'created_at',
+                 'updated_at')
+    
+    authors = _LazyJSON(list)
     
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
-class SearchCache:
+class SearchCache(_RowModel):
     __tablename__ = 'search_cache'
+    __slots__ = ('id', '_raw_keywords', 'days_back', 'paper_ids', 'created_at', 'expires_at')
+    
+    keywords = _LazyJSON(list)
     
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
-class AnalysisCache:
+class AnalysisCache(_RowModel):
     __tablename__ = 'analysis_cache'
+    __slots__ = ('id', 'title', 'abstract', 'main_findings', 'innovations', 'limitations',
+                 'future_directions', 'abstract_cn', 'created_at')
     
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
-class KeywordIndex:
+class KeywordIndex(_RowModel):
     __tablename__ = 'keyword_index'
+    __slots__ = ('id', 'keyword', 'paper_id')
     
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
-class GroupSavedPaper:
+class GroupSavedPaper(_RowModel):
     __tablename__ = 'group_saved_papers'
+    __slots__ = ('group_id', 'paper_id', 'saved_at')
     
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
     
+    _upsert_sql = _INSERT_GROUP_SAVED_SQL
+    
+    def _to_row(self):
+        """转换为 _upsert_sql 的参数元组"""
+        # 确保 saved_at 是字符串
+        return (getattr(self, 'group_id', None),
+                getattr(self, 'paper_id', None),
+                _to_iso(getattr(self, 'saved_at', None)))
+    
     def save(self):
         """保存到数据库"""
-        from models.simple_db import get_db
-        db = get_db()
-        
-        # 获取数据并确保 saved_at 是字符串
-        group_id = getattr(self, 'group_id', None)
-        paper_id = getattr(self, 'paper_id', None)
-        saved_at = getattr(self, 'saved_at', None)
-        
-        # 转换 datetime 对象为字符串
-        if hasattr(saved_at, 'isoformat'):
-            saved_at = saved_at.isoformat()
-        
-        # 检查是否已存在
-        check = db.fetchone(
-            'SELECT id FROM group_saved_papers WHERE group_id = ? AND paper_id = ?',
-            (group_id, paper_id)
-        )
-        if not check:
-            db.execute(
-                'INSERT INTO group_saved_papers (group_id, paper_id, saved_at) VALUES (?, ?, ?)',
-                (group_id, paper_id, saved_at)
-            )
-
-class GroupViewedPaper:
+        get_db().execute(self._upsert_sql, self._to_row())
+
+class GroupViewedPaper(_RowModel):
     __tablename__ = 'group_viewed_papers'
+    __slots__ = ('group_id', 'paper_id', 'viewed_at')
     
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
     
+    _upsert_sql = _INSERT_GROUP_VIEWED_SQL
+    
+    def _to_row(self):
+        """转换为 _upsert_sql 的参数元组"""
+        return (getattr(self, 'group_id', None),
+                getattr(self, 'paper_id', None),
+                getattr(self, 'viewed_at', None))
+    
     def save(self):
         """保存到数据库"""
-        from models.simple_db import get_db
-        db = get_db()
-        data = {
-            'group_id': getattr(self, 'group_id', None),
-            'paper_id': getattr(self, 'paper_id', None),
-            'viewed_at': getattr(self, 'viewed_at', None)
-        }
-        # 检查是否已存在
-        check = db.fetchone(
-            'SELECT id FROM group_viewed_papers WHERE group_id = ? AND paper_id = ?',
-            (data['group_id'], data['paper_id'])
-        )
-        if not check:
-            db.execute(
-                'INSERT INTO group_viewed_papers (group_id, paper_id, viewed_at) VALUES (?, ?, ?)',
-                (data['group_id'], data['paper_id'], data['viewed_at'])
-            )
-
-class UserPaper:
+        get_db().execute(self._upsert_sql, self._to_row())
+
+class UserPaper(_RowModel):
     __tablename__ = 'user_papers'
+    __slots__ = ('id', 'user_id', 'paper_id', 'is_saved', 'is_viewed', 'viewed_at', 'saved_at')
     
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+# 模型类 -> 表名（模块加载时构建一次）
+_TABLE_MAP = {
+    cls: cls.__tablename__
+    for cls in (User, Session, KeywordGroup, Paper, SearchCache, AnalysisCache,
+                KeywordIndex, GroupSavedPaper, GroupViewedPaper, UserPaper)
+}
+
+# 表名 -> 模型类
+_MODEL_MAP = {table_name: cls for cls, table_name in _TABLE_MAP.items()}
+
+def _resolve_table_name(model_class):
+    """解析模型类（或表名字符串）对应的表名"""
+    if isinstance(model_class, str):
+        return model_class
+    table_name = _TABLE_MAP.get(model_class) or getattr(model_class, '__tablename__', None)
+    return table_name or model_class.__name__.lower() + 's'
+
 # 兼容函数
 def get_db_manager(db_path=None):
     """获取数据库管理器（兼容函数）"""
@@ -4,14 +4,16 @@
 使用 Text 存储 JSON 数据，手动序列化/反序列化
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, Index, text
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, Index, func, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.types import TypeDecorator
 from datetime import datetime
-import json
 import os
 
+from utils.json_utils import json_dumps, json_loads
+from models.simple_db import NEW_DB_PAGE_SIZE, NOW_DEFAULT
+
 Base = declarative_base()
 
 class JSONColumn(TypeDecorator):
@@ -21,13 +23,13 @@ class JSONColumn(TypeDecorator):
     def process_bind_param(self, value, dialect):
         if value is None:
             return None
-        return json.dumps(value)
+        return json_dumps(value)
     
     def process_result_value(self, value, dialect):
         if value is None:
             return None
         try:
-            return json.loads(value)
+            return json_loads(value)
         except:
             return value
 
@@ -38,7 +40,7 @@ class User(Base):
     id = Column(String(64), primary_key=True)
     username = Column(String(100), nullable=False, unique=True, index=True)
     email = Column(String(255), nullable=False, unique=True, index=True)
-    password_hash = Column(String(128), nullable=False)
+    password_hash = Column(String(255), nullable=False)
     password_salt = Column(String(64), nullable=False)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
@@ -48,10 +50,17 @@ class User(Base):
     # 偏好设置(JSON存储)
     preferences = Column(JSONColumn, default=dict)
     
-    # 关系
-    keyword_groups = relationship("KeywordGroup", back_populates="user", cascade="all, delete-orphan")
-    sessions = relationship("Session", back_populates="user", cascade="all, delete-orphan")
-    user_papers = relationship("UserPaper", back_populates="user", cascade="all, delete-orphan")
+    # 关系（一对多集合使用 selectin：加载父对象时用一条 IN 查询批量加载，避免 N+1）
+    keyword_groups = relationship("KeywordGroup", back_populates="user", cascade="all, delete-orphan", lazy="selectin")
+    sessions = relationship("Session", back_populates="user", cascade="all, delete-orphan", lazy="selectin")
+    user_papers = relationship("UserPaper", back_populates="user", cascade="all, delete-orphan", lazy="selectin")
+    
+    # 表达式唯一索引：用户名/邮箱不区分大小写唯一，lower(col) = ? 查找也走该索引
+    # 与 simple_db 中创建的索引同名
+    __table_args__ = (
+        Index('ix_users_username_lower', func.lower(username), unique=True),
+        Index('ix_users_email_lower', func.lower(email), unique=True),
+    )
 
 class Session(Base):
     """会话表"""
@@ -60,7 +69,7 @@ class Session(Base):
     id = Column(String(128), primary_key=True)
     user_id = Column(String(64), ForeignKey('users.id'), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.now)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     ip_address = Column(String(45), nullable=True)
     user_agent = Column(String(512), nullable=True)
     
@@ -84,8 +93,13 @@ class KeywordGroup(Base):
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
     user = relationship("User", back_populates="keyword_groups")
-    saved_papers = relationship("GroupSavedPaper", back_populates="group", cascade="all, delete-orphan")
-    viewed_papers = relationship("GroupViewedPaper", back_populates="group", cascade="all, delete-orphan")
+    saved_papers = relationship("GroupSavedPaper", back_populates="group", cascade="all, delete-orphan", lazy="selectin")
+    viewed_papers = relationship("GroupViewedPaper", back_populates="group", cascade="all, delete-orphan", lazy="selectin")
+    
+    # 索引：用户的组列表按 (user_id, is_active, created_at) 范围扫描
+    __table_args__ = (
+        Index('idx_kg_user', 'user_id', 'is_active', created_at.desc()),
+    )
 
 class Paper(Base):
     """文献表"""
@@ -123,6 +137,8 @@ class Paper(Base):
     __table_args__ = (
         Index('idx_papers_created', 'created_at'),
         Index('idx_papers_analyzed', 'is_analyzed'),
+        # 按发表日期分页（ORDER BY pub_date DESC, id DESC 反向扫描该索引，无需排序）
+        Index('idx_papers_pub_date', 'pub_date', 'id'),
     )
 
 class UserPaper(Base):
@@ -139,30 +155,41 @@ class UserPaper(Base):
     
     user = relationship("User", back_populates="user_papers")
     paper = relationship("Paper")
+    
+    __table_args__ = (
+        Index('idx_up_user', 'user_id', 'paper_id'),
+    )
 
 class GroupSavedPaper(Base):
     """组内收藏的文献"""
     __tablename__ = 'group_saved_papers'
     
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    group_id = Column(String(64), ForeignKey('keyword_groups.id'), nullable=False, index=True)
-    paper_id = Column(String(64), ForeignKey('papers.id'), nullable=False, index=True)
-    saved_at = Column(DateTime, default=datetime.now)
+    group_id = Column(String(64), ForeignKey('keyword_groups.id'), primary_key=True)
+    paper_id = Column(String(64), ForeignKey('papers.id'), primary_key=True, index=True)
+    saved_at = Column(DateTime, default=datetime.now, server_default=text(NOW_DEFAULT))
     
     group = relationship("KeywordGroup", back_populates="saved_papers")
     paper = relationship("Paper")
+    
+    # (group_id, paper_id) 复合主键 + WITHOUT ROWID，与 simple_db 的表结构一致
+    __table_args__ = {'sqlite_with_rowid': False}
 
 class GroupViewedPaper(Base):
     """组内阅读过的文献"""
     __tablename__ = 'group_viewed_papers'
     
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    group_id = Column(String(64), ForeignKey('keyword_groups.id'), nullable=False, index=True)
-    paper_id = Column(String(64), ForeignKey('papers.id'), nullable=False, index=True)
-    viewed_at = Column(DateTime, default=datetime.now)
+    group_id = Column(String(64), ForeignKey('keyword_groups.id'), primary_key=True)
+    paper_id = Column(String(64), ForeignKey('papers.id'), primary_key=True, index=True)
+    viewed_at = Column(DateTime, default=datetime.now, server_default=text(NOW_DEFAULT))
     
     group = relationship("KeywordGroup", back_populates="viewed_papers")
     paper = relationship("Paper")
+    
+    # (group_id, paper_id) 复合主键 + WITHOUT ROWID，与 simple_db 的表结构一致
+    __table_args__ = (
+        Index('idx_gvp_group_viewed_at', 'group_id', viewed_at.desc()),
+        {'sqlite_with_rowid': False},
+    )
 
 class SearchCache(Base):
     """搜索缓存表"""
@@ -199,6 +226,33 @@ class KeywordIndex(Base):
     
     paper = relationship("Paper")
 
+class UserKeyword(Base):
+    """用户关键词表（preferences['keywords'] 的反范式副本）"""
+    __tablename__ = 'user_keywords'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(64), ForeignKey('users.id'), nullable=False, index=True)
+    keyword = Column(String(200), nullable=False)
+
+# 每个新连接都要设置的 PRAGMA（连接级设置，不持久化到数据库文件）
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",    # 平衡性能和安全性
+    "PRAGMA cache_size=-64000",     # 64MB 页面缓存
+    "PRAGMA temp_store=MEMORY",     # 临时表存储在内存
+    "PRAGMA mmap_size=268435456",   # 256MB 内存映射
+    "PRAGMA busy_timeout=5000",     # 写锁冲突时最多等待 5 秒，而不是立即报错
+    "PRAGMA wal_autocheckpoint=1000",  # 每 1000 页检查点一次，避免 WAL 文件膨胀
+)
+
+def _apply_connection_pragmas(dbapi_connection, connection_record):
+    """为新建立的 SQLite 连接设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in _CONNECTION_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
 class DatabaseManager:
     """数据库管理器"""
     
@@ -214,20 +268,26 @@ class DatabaseManager:
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
         
+        # 新建数据库时才能设置页大小（WAL 模式下页大小不可再修改）
+        is_new_db = not os.path.exists(self.db_path) or os.path.getsize(self.db_path) == 0
+        
         self.engine = create_engine(
             f'sqlite:///{self.db_path}',
             echo=False,
-            connect_args={'check_same_thread': False}
+            connect_args={'check_same_thread': False},
+            query_cache_size=1200  # 编译后 SQL 的缓存条目数，避免重复编译相同查询
         )
         
+        # 连接级 PRAGMA 只对当前连接生效，需在连接池每次建立新连接时设置
+        event.listen(self.engine, 'connect', _apply_connection_pragmas)
+        
         # V2.6 优化：启用 WAL 模式，大幅提升并发写入性能
         # WAL 模式允许多个读取者和一个写入者同时访问数据库
         with self.engine.connect() as conn:
+            if is_new_db:
+                # 通常文件已由 SimpleDatabase 创建并设置页大小；单独使用 SmartCache 时在这里设置
+                conn.execute(text(f"PRAGMA page_size={NEW_DB_PAGE_SIZE}"))
             conn.execute(text("PRAGMA journal_mode=WAL"))
-            conn.execute(text("PRAGMA synchronous=NORMAL"))  # 平衡性能和安全性
-            conn.execute(text("PRAGMA cache_size=-64000"))   # 64MB 页面缓存
-            conn.execute(text("PRAGMA temp_store=MEMORY"))   # 临时表存储在内存
-            conn.execute(text("PRAGMA mmap_size=268435456")) # 256MB 内存映射
         
         Base.metadata.create_all(self.engine)
         self.Session = sessionmaker(bind=self.engine)
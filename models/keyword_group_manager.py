@@ -4,11 +4,64 @@
 支持多组关键词和组独立数据
 """
 
+import copy
 import secrets
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional
 
-from models.adapter import get_db_session, KeywordGroup, GroupSavedPaper, GroupViewedPaper
+from cachetools import TTLCache
+
+from models.adapter import get_db_session, KeywordGroup
+from models.simple_db import get_db
+
+# Dashboard 汇总缓存：(db_path, user_id) -> (version, summary)
+# 写操作递增用户版本号使缓存失效；TTL 兜底防止遗漏的失效（如其他进程写入）
+_SUMMARY_CACHE = TTLCache(maxsize=256, ttl=30)
+_user_versions: Dict[tuple, int] = {}
+_summary_lock = threading.Lock()
+
+# 组归属检查以 EXISTS 子查询并入主语句；saved_at / viewed_at 由列默认值填充，一次往返完成“检查组 + 操作”
+_GROUP_OWNED = "EXISTS (SELECT 1 FROM keyword_groups WHERE id = ? AND user_id = ?)"
+
+_SAVE_PAPER_SQL = f'''
+    INSERT OR IGNORE INTO group_saved_papers (group_id, paper_id)
+    SELECT ?, ? WHERE {_GROUP_OWNED}
+'''
+_UNSAVE_PAPER_SQL = f'''
+    DELETE FROM group_saved_papers
+    WHERE group_id = ? AND paper_id = ? AND {_GROUP_OWNED}
+'''
+_IS_SAVED_SQL = f'''
+    SELECT 1 FROM group_saved_papers
+    WHERE group_id = ? AND paper_id = ? AND {_GROUP_OWNED} LIMIT 1
+'''
+_SAVED_PAPERS_SQL = f'''
+    SELECT paper_id FROM group_saved_papers
+    WHERE group_id = ? AND {_GROUP_OWNED}
+'''
+_MARK_VIEWED_SQL = f'''
+    INSERT OR IGNORE INTO group_viewed_papers (group_id, paper_id)
+    SELECT ?, ? WHERE {_GROUP_OWNED}
+'''
+_IS_VIEWED_SQL = f'''
+    SELECT 1 FROM group_viewed_papers
+    WHERE group_id = ? AND paper_id = ? AND {_GROUP_OWNED} LIMIT 1
+'''
+_ALL_SAVED_PAPERS_SQL = '''
+    SELECT DISTINCT paper_id FROM group_saved_papers
+    WHERE group_id IN (SELECT id FROM keyword_groups WHERE user_id = ?)
+'''
+
+# 一次查询得到用户各组的统计；相关子查询走 group_id 索引，避免两个 LEFT JOIN 的行数相乘
+_GROUP_STATS_SQL = '''
+    SELECT kg.id,
+           (SELECT COUNT(*) FROM group_viewed_papers WHERE group_id = kg.id) AS total_viewed,
+           (SELECT COUNT(*) FROM group_saved_papers WHERE group_id = kg.id) AS total_saved,
+           (SELECT MAX(viewed_at) FROM group_viewed_papers WHERE group_id = kg.id) AS last_access
+    FROM keyword_groups kg
+    WHERE kg.user_id = ?
+'''
 
 class KeywordGroupManager:
     """
@@ -39,9 +92,7 @@ class KeywordGroupManager:
         if not keywords or len(keywords) == 0:
             return {'success': False, 'error': '关键词不能为空'}
         
-        # 清理关键词
-        keywords = [k.strip() for k in keywords if k.strip()]
-        keywords = list(set(keywords))  # 去重
+        keywords = self._clean_keywords(keywords)
         
         if len(keywords) == 0:
             return {'success': False, 'error': '关键词不能为空'}
@@ -68,6 +119,7 @@ class KeywordGroupManager:
             
             db.add(new_group)
             db.commit()
+            self._bump_user_version(user_id)
             
             return {
                 'success': True,
@@ -103,9 +155,7 @@ class KeywordGroupManager:
             for field in allowed_fields:
                 if field in updates:
                     if field == 'keywords':
-                        # 清理关键词
-                        keywords = [k.strip() for k in updates[field] if k.strip()]
-                        keywords = list(set(keywords))
+                        keywords = self._clean_keywords(updates[field])
                         if len(keywords) == 0:
                             return {'success': False, 'error': '关键词不能为空'}
                         group.keywords = keywords
@@ -118,11 +168,8 @@ class KeywordGroupManager:
             
             group.updated_at = datetime.now()
             
-            # 显式调用 save 方法保存更改
-            if hasattr(group, 'save'):
-                group.save()
-            
             db.commit()
+            self._bump_user_version(user_id)
             
             return {'success': True, 'group': self._group_to_dict(group)}
             
@@ -134,28 +181,31 @@ class KeywordGroupManager:
     
     def delete_group(self, user_id: str, group_id: str) -> Dict:
         """删除关键词组"""
-        db = self._get_session()
         try:
-            group = db.query(KeywordGroup).filter_by(id=group_id, user_id=user_id).first()
+            # 直接按 (id, user_id) 删除，由受影响行数判断组是否存在
+            deleted = get_db(self.db_path).execute_rowcount(
+                "DELETE FROM keyword_groups WHERE id = ? AND user_id = ?",
+                (group_id, user_id)
+            )
             
-            if not group:
+            if not deleted:
                 return {'success': False, 'error': '组不存在'}
             
-            db.delete(group)  # 级联删除关联数据
-            db.commit()
-            
+            self._bump_user_version(user_id)
             return {'success': True}
             
         except Exception as e:
-            db.rollback()
             return {'success': False, 'error': f'删除失败: {str(e)}'}
-        finally:
-            db.close()
     
-    def get_user_groups(self, user_id: str, include_inactive: bool = False) -> List[Dict]:
+    def get_user_groups(self, user_id: str, include_inactive: bool = False,
+                        limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
         """
         获取用户的所有关键词组
         
+        Args:
+            limit: 最多返回的组数，None 表示不限制
+            offset: 跳过的组数（分页）
+        
         Returns:
             按创建时间排序的组列表
         """
@@ -166,12 +216,14 @@ class KeywordGroupManager:
             if not include_inactive:
                 query = query.filter_by(is_active=True)
             
-            groups = query.order_by("created_at DESC").all()
+            # 排序和分页在 SQL 中完成，走 idx_kg_user(user_id, is_active, created_at DESC)
+            groups = query.order_by("created_at DESC").limit(limit).offset(offset).all()
+            stats = self._get_groups_stats(user_id)
             
             result = []
             for group in groups:
                 group_dict = self._group_to_dict(group)
-                group_dict['stats'] = self._get_group_stats(user_id, group.id)
+                group_dict['stats'] = stats.get(group.id) or self._empty_stats()
                 result.append(group_dict)
             
             return result
@@ -197,30 +249,33 @@ class KeywordGroupManager:
     
     def _get_group_stats(self, user_id: str, group_id: str) -> Dict:
         """获取组的统计信息"""
-        db = self._get_session()
-        try:
-            # 统计收藏的文献数（从数据库）
-            saved_count = db.query(GroupSavedPaper).filter_by(group_id=group_id).count()
-            viewed_count = db.query(GroupViewedPaper).filter_by(group_id=group_id).count()
-            
-            last_viewed = db.query(GroupViewedPaper).filter_by(group_id=group_id).first()
-            
-            # 处理 last_access 时间格式
-            last_access = None
-            if last_viewed and last_viewed.viewed_at:
-                if hasattr(last_viewed.viewed_at, 'isoformat'):
-                    last_access = last_viewed.viewed_at.isoformat()
-                else:
-                    # 已经是字符串格式
-                    last_access = last_viewed.viewed_at
-            
-            return {
-                'total_viewed': viewed_count,
-                'total_saved': saved_count,
-                'last_access': last_access
+        stats = self._get_groups_stats(user_id, group_id)
+        return stats.get(group_id) or self._empty_stats()
+    
+    def _get_groups_stats(self, user_id: str, group_id: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        一次查询获取用户各组的统计信息
+        
+        Returns:
+            {group_id: {'total_viewed', 'total_saved', 'last_access'}}
+        """
+        query, params = _GROUP_STATS_SQL, (user_id,)
+        if group_id is not None:
+            query, params = query + " AND kg.id = ?", (user_id, group_id)
+        
+        stats = {}
+        for row in get_db(self.db_path).fetchall_rows(query, params):
+            stats[row['id']] = {
+                'total_viewed': row['total_viewed'],
+                'total_saved': row['total_saved'],
+                # viewed_at 以字符串存储，MAX 即最近一次浏览时间
+                'last_access': row['last_access']
             }
-        finally:
-            db.close()
+        return stats
+    
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {'total_viewed': 0, 'total_saved': 0, 'last_access': None}
     
     def reorder_groups(self, user_id: str, group_order: List[str]) -> Dict:
         """
@@ -229,205 +284,116 @@ class KeywordGroupManager:
         Args:
             group_order: 组ID列表，按期望的顺序排列
         """
-        db = self._get_session()
+        if not group_order:
+            return {'success': True}
+        
         try:
-            # 验证所有组ID都存在
+            db = get_db(self.db_path)
+            placeholders = ','.join('?' * len(group_order))
+            
+            # 一次查询验证所有组ID都存在
+            found = set(db.fetchcol(
+                f"SELECT id FROM keyword_groups WHERE user_id = ? AND id IN ({placeholders})",
+                (user_id, *group_order)
+            ))
             for group_id in group_order:
-                group = db.query(KeywordGroup).filter_by(id=group_id, user_id=user_id).first()
-                if not group:
+                if group_id not in found:
                     return {'success': False, 'error': f'组不存在: {group_id}'}
             
-            # 重新排序（通过修改created_at实现）
+            # 重新排序（通过修改created_at实现），单条 UPDATE ... CASE 完成
+            # 越靠前时间戳越大（这样按时间倒序排列时会显示在前面）
             current_time = datetime.now().timestamp()
+            case_params = []
             for i, group_id in enumerate(group_order):
-                group = db.query(KeywordGroup).filter(
-                    KeywordGroup.id == group_id
-                ).first()
-                # 越靠前时间戳越大（这样按时间倒序排列时会显示在前面）
-                group.created_at = datetime.fromtimestamp(current_time - i)
+                case_params += [group_id, datetime.fromtimestamp(current_time - i).isoformat()]
             
-            db.commit()
+            db.execute(
+                f"UPDATE keyword_groups SET created_at = CASE id "
+                f"{' '.join(['WHEN ? THEN ?'] * len(group_order))} END "
+                f"WHERE user_id = ? AND id IN ({placeholders})",
+                (*case_params, user_id, *group_order)
+            )
+            self._bump_user_version(user_id)
             return {'success': True}
             
         except Exception as e:
-            db.rollback()
             return {'success': False, 'error': f'排序失败: {str(e)}'}
-        finally:
-            db.close()
     
     # ============ 组独立数据操作 ============
     
     def save_paper_to_group(self, user_id: str, group_id: str, paper_hash: str) -> Dict:
         """在特定组中收藏文献"""
-        db = self._get_session()
         try:
-            # 检查组是否存在
-            group = db.query(KeywordGroup).filter_by(id=group_id, user_id=user_id).first()
-            
-            if not group:
+            db = get_db(self.db_path)
+            inserted = db.execute_rowcount(
+                _SAVE_PAPER_SQL,
+                (group_id, paper_hash, group_id, user_id)
+            )
+            # 未插入：已收藏，或组不存在（仅此时才需要区分）
+            if not inserted and not self._group_exists(db, user_id, group_id):
                 return {'success': False, 'error': '组不存在'}
-            
-            # 检查是否已收藏
-            existing = db.query(GroupSavedPaper).filter_by(group_id=group_id, paper_id=paper_hash).first()
-            
-            if not existing:
-                new_saved = GroupSavedPaper(
-                    group_id=group_id,
-                    paper_id=paper_hash,
-                    saved_at=datetime.now().isoformat()
-                )
-                db.add(new_saved)
-                db.commit()
+            if inserted:
+                self._bump_user_version(user_id)
             
             return {'success': True}
             
         except Exception as e:
-            db.rollback()
             return {'success': False, 'error': f'收藏失败: {str(e)}'}
-        finally:
-            db.close()
     
     def unsave_paper_from_group(self, user_id: str, group_id: str, paper_hash: str) -> Dict:
         """取消收藏文献"""
-        db = self._get_session()
         try:
-            # 检查组是否存在
-            group = db.query(KeywordGroup).filter_by(id=group_id, user_id=user_id).first()
-            
-            if not group:
+            db = get_db(self.db_path)
+            deleted = db.execute_rowcount(
+                _UNSAVE_PAPER_SQL, (group_id, paper_hash, group_id, user_id)
+            )
+            # 未删除：本就未收藏，或组不存在（仅此时才需要区分）
+            if not deleted and not self._group_exists(db, user_id, group_id):
                 return {'success': False, 'error': '组不存在'}
-            
-            # 删除收藏记录
-            saved = db.query(GroupSavedPaper).filter_by(group_id=group_id, paper_id=paper_hash).first()
-            
-            if saved:
-                db.delete(saved)
-                db.commit()
+            if deleted:
+                self._bump_user_version(user_id)
             
             return {'success': True}
             
         except Exception as e:
-            db.rollback()
             return {'success': False, 'error': f'取消收藏失败: {str(e)}'}
-        finally:
-            db.close()
     
     def is_paper_saved_in_group(self, user_id: str, group_id: str, paper_hash: str) -> bool:
         """检查文献是否在特定组中已收藏"""
-        db = self._get_session()
-        try:
-            # 检查组是否存在
-            group = db.query(KeywordGroup).filter_by(id=group_id, user_id=user_id).first()
-            
-            if not group:
-                return False
-            
-            saved = db.query(GroupSavedPaper).filter_by(group_id=group_id, paper_id=paper_hash).first()
-            
-            return saved is not None
-            
-        finally:
-            db.close()
+        return get_db(self.db_path).exists(
+            _IS_SAVED_SQL, (group_id, paper_hash, group_id, user_id)
+        )
     
     def get_saved_papers_in_group(self, user_id: str, group_id: str) -> List[str]:
-        """获取特定组中收藏的所有文献"""
-        db = self._get_session()
-        try:
-            # 检查组是否存在
-            group = db.query(KeywordGroup).filter_by(id=group_id, user_id=user_id).first()
-            
-            if not group:
-                return []
-            
-            saved_papers = db.query(GroupSavedPaper).filter_by(
-                group_id=group_id
-            ).all()
-            
-            return [sp.paper_id for sp in saved_papers]
-            
-        finally:
-            db.close()
+        """获取特定组中收藏的所有文献（组不存在时返回空列表）"""
+        return get_db(self.db_path).fetchcol(
+            _SAVED_PAPERS_SQL, (group_id, group_id, user_id)
+        )
     
     def get_all_saved_papers_for_user(self, user_id: str) -> List[str]:
         """
         获取用户所有组中收藏的所有文献（去重）
         用于优化前端加载，减少多次请求
         """
-        db = self._get_session()
-        try:
-            # 获取用户的所有组ID
-            groups = db.query(KeywordGroup).filter_by(user_id=user_id).all()
-            group_ids = [g.id for g in groups]
-            
-            if not group_ids:
-                return []
-            
-            # 使用原始 SQL 查询所有组的收藏
-            # 构建占位符
-            placeholders = ','.join(['?' for _ in group_ids])
-            query = f"SELECT DISTINCT paper_id FROM group_saved_papers WHERE group_id IN ({placeholders})"
-            
-            # 执行查询
-            from models.simple_db import get_db
-            simple_db = get_db()
-            results = simple_db.fetchall(query, tuple(group_ids))
-            
-            # 提取 paper_id
-            unique_hashes = [row['paper_id'] for row in results] if results else []
-            return unique_hashes
-            
-        finally:
-            db.close()
+        return get_db(self.db_path).fetchcol(_ALL_SAVED_PAPERS_SQL, (user_id,))
     
     def mark_paper_viewed_in_group(self, user_id: str, group_id: str, paper_hash: str):
         """标记文献在特定组中已读"""
-        db = self._get_session()
         try:
-            # 检查组是否存在
-            group = db.query(KeywordGroup).filter_by(id=group_id, user_id=user_id).first()
-            
-            if not group:
-                return
-            
-            # 检查是否已记录
-            existing = db.query(GroupViewedPaper).filter_by(group_id=group_id, paper_id=paper_hash).first()
-            
-            if not existing:
-                new_viewed = GroupViewedPaper(
-                    group_id=group_id,
-                    paper_id=paper_hash,
-                    viewed_at=datetime.now()
-                )
-                db.add(new_viewed)
-                db.commit()
-            
+            inserted = get_db(self.db_path).execute_rowcount(
+                _MARK_VIEWED_SQL,
+                (group_id, paper_hash, group_id, user_id)
+            )
+            if inserted:
+                self._bump_user_version(user_id)
         except Exception as e:
-            db.rollback()
-        finally:
-            db.close()
+            print(f"⚠️ 标记已读失败: {e}")
     
     def is_paper_viewed_in_group(self, user_id: str, group_id: str, paper_hash: str) -> bool:
         """检查文献在特定组中是否已读"""
-        db = self._get_session()
-        try:
-            # 检查组是否存在
-            group = db.query(KeywordGroup).filter_by(id=group_id, user_id=user_id).first()
-            
-            if not group:
-                return False
-            
-            viewed = db.query(GroupViewedPaper).filter_by(group_id=group_id, paper_id=paper_hash).first()
-            
-            return viewed is not None
-            
-        finally:
-            db.close()
-    
-    def update_group_access_time(self, user_id: str, group_id: str):
-        """更新组的最后访问时间"""
-        # 通过添加一条浏览记录来实现
-        # 实际上最后一次浏览记录的时间就是最后访问时间
-        pass
+        return get_db(self.db_path).exists(
+            _IS_VIEWED_SQL, (group_id, paper_hash, group_id, user_id)
+        )
     
     # ============ 汇总Dashboard数据 ============
     
@@ -435,9 +401,26 @@ class KeywordGroupManager:
         """
         获取用户所有组的汇总信息（用于Dashboard）
         """
+        key = (self.db_path, user_id)
+        with _summary_lock:
+            version = _user_versions.get(key, 0)
+            cached = _SUMMARY_CACHE.get(key)
+        if cached is not None and cached[0] == version:
+            return copy.deepcopy(cached[1])
+        
+        summary = self._build_user_groups_summary(user_id)
+        with _summary_lock:
+            # 计算期间发生写入则版本已变化，不缓存旧结果
+            if _user_versions.get(key, 0) == version:
+                _SUMMARY_CACHE[key] = (version, summary)
+        return copy.deepcopy(summary)
+    
+    def _build_user_groups_summary(self, user_id: str) -> Dict:
+        """从数据库计算用户所有组的汇总信息"""
         db = self._get_session()
         try:
             groups = db.query(KeywordGroup).filter_by(user_id=user_id).all()
+            groups_stats = self._get_groups_stats(user_id)
 
             total_viewed = 0
             total_saved = 0
@@ -445,7 +428,7 @@ class KeywordGroupManager:
 
             summary_groups = []
             for group in groups:
-                stats = self._get_group_stats(user_id, group.id)
+                stats = groups_stats.get(group.id) or self._empty_stats()
                 viewed = stats.get('total_viewed', 0)
                 saved = stats.get('total_saved', 0)
 
@@ -507,6 +490,26 @@ class KeywordGroupManager:
         
         return result
     
+    @staticmethod
+    def _clean_keywords(keywords: List[str]) -> List[str]:
+        """清理关键词：去除首尾空白和空项，按首次出现的顺序去重"""
+        return list(dict.fromkeys(k for k in (s.strip() for s in keywords) if k))
+    
+    def _bump_user_version(self, user_id: str):
+        """用户的组数据发生变化，使其 Dashboard 汇总缓存失效"""
+        key = (self.db_path, user_id)
+        with _summary_lock:
+            _user_versions[key] = _user_versions.get(key, 0) + 1
+            _SUMMARY_CACHE.pop(key, None)
+    
+    @staticmethod
+    def _group_exists(db, user_id: str, group_id: str) -> bool:
+        """检查组是否存在且属于该用户"""
+        return db.exists(
+            "SELECT 1 FROM keyword_groups WHERE id = ? AND user_id = ? LIMIT 1",
+            (group_id, user_id)
+        )
+    
     def _group_to_dict(self, group: KeywordGroup) -> Dict:
         """将KeywordGroup对象转换为字典"""
         return {
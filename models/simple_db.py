@@ -6,22 +6,72 @@
 
 import sqlite3
 import os
+import atexit
+import threading
+import weakref
 import json
 from datetime import datetime
 
+# 每个连接建立时设置的 PRAGMA（连接级设置，不持久化到数据库文件）
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",    # WAL 下只在检查点时 fsync，提交不再逐次刷盘
+    "PRAGMA temp_store=MEMORY",     # 临时表存储在内存
+    "PRAGMA mmap_size=268435456",   # 256MB 内存映射
+    "PRAGMA cache_size=-20000",     # 约 20MB 页面缓存
+    "PRAGMA busy_timeout=5000",     # 写锁冲突时最多等待 5 秒，而不是立即报错
+)
+
+# 新建数据库文件的页大小：8KB 页使摘要等长文本行跨页更少，减少 I/O 次数
+# （只能在建表前设置，WAL 模式下不可再修改）
+NEW_DB_PAGE_SIZE = 8192
+
+# 时间列默认值：由 SQLite 生成本地时间的 ISO 字符串（与 datetime.now().isoformat() 同序，精确到毫秒）
+NOW_DEFAULT = "(strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'))"
+
+# 不区分大小写唯一的登录列：(索引名, 列名)
+_LOGIN_UNIQUE_INDEXES = (('ix_users_username_lower', 'username'), ('ix_users_email_lower', 'email'))
+
+# 组内收藏/阅读表：(group_id, paper_id) 即主键，WITHOUT ROWID 省去 rowid B-tree 和额外的唯一索引
+_GROUP_PAPER_TABLES = (('group_saved_papers', 'saved_at'), ('group_viewed_papers', 'viewed_at'))
+_GROUP_PAPER_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        group_id TEXT NOT NULL,
+        paper_id TEXT NOT NULL,
+        {time_column} TEXT DEFAULT ''' + NOW_DEFAULT + ''',
+        PRIMARY KEY (group_id, paper_id)
+    ) WITHOUT ROWID
+'''
+
+
+def _resolve_db_path(db_path):
+    """转换为绝对路径（相对路径相对于项目根目录，simple_db.py 在 models/ 目录下）"""
+    if not os.path.isabs(db_path):
+        current_file = os.path.abspath(__file__)
+        project_root = os.path.dirname(os.path.dirname(current_file))
+        db_path = os.path.join(project_root, db_path)
+    return os.path.normpath(db_path)
+
+
+# 所有数据库实例（弱引用），进程退出时统一关闭主线程的连接
+_all_instances = weakref.WeakSet()
+
+
+@atexit.register
+def _close_all_connections():
+    """进程退出时关闭各实例在当前线程的连接（只注册一次）"""
+    for instance in list(_all_instances):
+        instance.close_thread()
+
+
 class SimpleDatabase:
     """简单的SQLite数据库管理器"""
     
     def __init__(self, db_path='data/literature.db'):
-        # 转换为绝对路径
-        if not os.path.isabs(db_path):
-            # 获取项目根目录（simple_db.py 在 models/ 目录下）
-            current_file = os.path.abspath(__file__)
-            project_root = os.path.dirname(os.path.dirname(current_file))
-            db_path = os.path.join(project_root, db_path)
-        
-        self.db_path = db_path
+        self.db_path = _resolve_db_path(db_path)
+        # 线程本地连接：同一线程内的查询复用连接，省去每次打开文件和设置 PRAGMA
+        self._local = threading.local()
         self._init_db()
+        _all_instances.add(self)
     
     def _init_db(self):
         """初始化数据库"""
@@ -32,6 +82,9 @@ class SimpleDatabase:
             try:
                 os.makedirs(db_dir, exist_ok=True)
             except Exception as e:
+                print(f"⚠️ 创建数据库目录失败: {e}")
+        
+        is_new_db = not os.path.exists(self.db_path) or os.path.getsize(self.db_path) == 0
         
         # 连接数据库（会自动创建文件）
         try:
@@ -40,6 +93,10 @@ class SimpleDatabase:
             raise
         cursor = conn.cursor()
         
+        # 新文件在第一张表创建前、启用 WAL 前设置页大小
+        if is_new_db:
+            cursor.execute(f"PRAGMA page_size={NEW_DB_PAGE_SIZE}")
+        
         # 创建用户表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -166,25 +223,41 @@ class SimpleDatabase:
             )
         ''')
         
-        # 创建组内收藏表
+        # 创建用户关键词表（preferences['keywords'] 的反范式副本，供按关键词聚合查询）
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_keywords'")
+        backfill_user_keywords = cursor.fetchone() is None
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS group_saved_papers (
+            CREATE TABLE IF NOT EXISTS user_keywords (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                group_id TEXT NOT NULL,
-                paper_id TEXT NOT NULL,
-                saved_at TEXT
+                user_id TEXT NOT NULL,
+                keyword TEXT NOT NULL
             )
         ''')
+        if backfill_user_keywords:
+            # 首次建表：从现有用户的 preferences 回填（按用户、关键词原顺序）
+            cursor.execute('''
+                INSERT INTO user_keywords (user_id, keyword)
+                SELECT u.id, k.value
+                FROM users u, json_each(
+                    CASE WHEN json_valid(u.preferences) THEN u.preferences ELSE '{}' END, '$.keywords'
+                ) k
+                WHERE k.type = 'text'
+                ORDER BY u.rowid, k.id
+            ''')
         
-        # 创建组内阅读表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS group_viewed_papers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                group_id TEXT NOT NULL,
-                paper_id TEXT NOT NULL,
-                viewed_at TEXT
-            )
-        ''')
+        # 创建组内收藏/阅读表（旧版带自增 id 的表见 _migrate_group_paper_tables）
+        for table, time_column in _GROUP_PAPER_TABLES:
+            cursor.execute(_GROUP_PAPER_TABLE_SQL.format(table=table, time_column=time_column))
+        
+        # 创建常用查询的索引
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_gvp_group_viewed_at ON group_viewed_papers(group_id, viewed_at DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_kg_user ON keyword_groups(user_id, is_active, created_at DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions(expires_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_user_keywords_user_id ON user_keywords(user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_keyword_index_keyword ON keyword_index(keyword)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_keyword_index_paper_id ON keyword_index(paper_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_up_user ON user_papers(user_id, paper_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_papers_pub_date ON papers(pub_date, id)")
         
         conn.commit()
         conn.close()
@@ -192,11 +265,22 @@ class SimpleDatabase:
         # 数据库迁移：添加缺失的列
         self._migrate_add_columns()
         
+        # 数据库迁移：组内收藏/阅读表改为 (group_id, paper_id) 主键的 WITHOUT ROWID 表
+        self._migrate_group_paper_tables()
+        
+        # 数据库迁移：用户名/邮箱的 lower() 表达式索引改为唯一索引
+        self._migrate_login_unique_indexes()
+        
+        # WAL 模式持久化在数据库文件中，设置一次即可；允许读写并发
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+        
         print(f"✅ 数据库初始化完成: {self.db_path}")
     
     def _migrate_add_columns(self):
         """数据库迁移：添加缺失的列"""
-        conn = self.get_connection()
+        conn = self._connect()
         cursor = conn.cursor()
         
         # 检查 users 表是否有 avatar 列
@@ -220,40 +304,148 @@ class SimpleDatabase:
         conn.commit()
         conn.close()
     
-    def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
+    def _migrate_group_paper_tables(self):
+        """
+        数据库迁移：旧版组内收藏/阅读表带自增 id，重建为 WITHOUT ROWID 表
+        复制时按 id 顺序 INSERT OR IGNORE，重复的 (group_id, paper_id) 保留最早的一条
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        for table, time_column in _GROUP_PAPER_TABLES:
+            columns = [row['name'] for row in cursor.execute(f"PRAGMA table_info({table})")]
+            if 'id' not in columns:
+                continue
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(f"DROP TABLE IF EXISTS {table}_new")
+                cursor.execute(_GROUP_PAPER_TABLE_SQL.format(table=f"{table}_new", time_column=time_column))
+                cursor.execute(f'''
+                    INSERT OR IGNORE INTO {table}_new (group_id, paper_id, {time_column})
+                    SELECT group_id, paper_id, {time_column} FROM {table} ORDER BY id
+                ''')
+                # 旧表上的索引随表一起删除，(group_id, paper_id) 唯一索引已由主键取代
+                cursor.execute(f"DROP TABLE {table}")
+                cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+                if table == 'group_viewed_papers':
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gvp_group_viewed_at ON group_viewed_papers(group_id, viewed_at DESC)")
+                cursor.execute("COMMIT")
+                print(f"✅ 数据库迁移: {table} 已改为 WITHOUT ROWID 表")
+            except Exception as e:
+                cursor.execute("ROLLBACK")
+                print(f"⚠️ 迁移 {table} 失败: {e}")
+        
+        conn.close()
+    
+    def _migrate_login_unique_indexes(self):
+        """
+        数据库迁移：用户名/邮箱不区分大小写唯一（lower(col) 上的唯一索引）
+        注册直接 INSERT，由该索引拒绝重复；旧库中已存在仅大小写不同的重复数据时保留普通索引
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        unique_flags = {row['name']: row['unique'] for row in cursor.execute("PRAGMA index_list(users)")}
+        for index_name, column in _LOGIN_UNIQUE_INDEXES:
+            if unique_flags.get(index_name):
+                continue
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+                cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON users(lower({column}))")
+                cursor.execute("COMMIT")
+            except sqlite3.IntegrityError as e:
+                cursor.execute("ROLLBACK")
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON users(lower({column}))")
+                print(f"⚠️ {column} 存在仅大小写不同的重复值，未能创建唯一索引: {e}")
+        
+        conn.close()
+    
+    def _connect(self):
+        """新建数据库连接并设置 PRAGMA"""
+        # isolation_level=None：单条语句自动提交，批量写入由 execute_batch 显式开启事务
+        # check_same_thread=False：仅为允许退出时由主线程关闭，连接本身只在所属线程使用
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         return conn
     
+    def get_connection(self):
+        """获取当前线程的数据库连接（每个线程复用同一连接，不要手动关闭）"""
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        # fork 出的子进程不能复用父进程的连接
+        if conn is None or local.pid != os.getpid():
+            conn = self._connect()
+            local.conn = conn
+            local.pid = os.getpid()
+        return conn
+    
+    def close_thread(self):
+        """关闭当前线程的数据库连接（如请求结束时调用）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+    
     def execute(self, query, params=()):
         """执行SQL语句"""
+        cursor = self.get_connection().execute(query, params)
+        return cursor.lastrowid
+    
+    def execute_rowcount(self, query, params=()):
+        """执行写入语句，返回受影响的行数"""
+        return self.get_connection().execute(query, params).rowcount
+    
+    def executemany(self, query, params_seq):
+        """批量执行同一SQL语句（单个事务）"""
+        self.execute_batch([(query, params_seq)])
+    
+    def execute_batch(self, statements):
+        """在单个事务中执行多组 (SQL, 参数序列)"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
-        lastrowid = cursor.lastrowid
-        conn.close()
-        return lastrowid
+        # BEGIN IMMEDIATE：开始即获取写锁，整批写入只提交（fsync）一次
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for query, params_seq in statements:
+                conn.executemany(query, params_seq)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
     
     def fetchone(self, query, params=()):
         """查询单条记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        row = cursor.fetchone()
-        conn.close()
+        row = self.get_connection().execute(query, params).fetchone()
         return dict(row) if row else None
     
     def fetchall(self, query, params=()):
         """查询多条记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        rows = self.get_connection().execute(query, params).fetchall()
         return [dict(row) for row in rows]
     
+    def fetchone_row(self, query, params=()):
+        """查询单条记录，返回 sqlite3.Row（不转换为字典）"""
+        return self.get_connection().execute(query, params).fetchone()
+    
+    def fetchall_rows(self, query, params=()):
+        """查询多条记录，返回 sqlite3.Row 列表（不转换为字典）"""
+        return self.get_connection().execute(query, params).fetchall()
+    
+    def fetchcol(self, query, params=()):
+        """查询单列，返回第一列的值列表（不构造字典）"""
+        return [row[0] for row in self.get_connection().execute(query, params)]
+    
+    def exists(self, query, params=()):
+        """查询是否至少返回一行（配合 SELECT 1 ... LIMIT 1 使用）"""
+        return self.get_connection().execute(query, params).fetchone() is not None
+    
+    def fetchscalar(self, query, params=()):
+        """查询单个值（第一行第一列），无结果时返回 None"""
+        row = self.get_connection().execute(query, params).fetchone()
+        return row[0] if row else None
+    
     def get_stats(self):
         """获取数据库统计信息"""
         tables = ['users', 'sessions', 'keyword_groups', 'papers', 
@@ -267,8 +459,11 @@ class SimpleDatabase:
                 stats[table] = 0
         return stats
 
-# 全局数据库实例
+# 全局数据库实例（最近一次获取的实例，get_db() 不带路径时返回它）
 _db_instance = None
+# 绝对路径 -> 数据库实例：同一文件只初始化一次，不会因为相对/绝对路径写法不同而重复创建
+_db_instances = {}
+_db_instances_lock = threading.Lock()
 
 def get_db(db_path=None):
     """获取全局数据库实例
@@ -277,18 +472,19 @@ def get_db(db_path=None):
         db_path: 数据库路径，默认使用配置的默认路径
     """
     global _db_instance
-    if _db_instance is None or (db_path and _db_instance.db_path != db_path):
-        if db_path:
-            _db_instance = SimpleDatabase(db_path)
-        else:
-            # 使用绝对路径，避免相对路径问题
-            # 从当前文件位置往上找，找到项目根目录
-            current_file = os.path.abspath(__file__)
-            # simple_db.py 在 models/ 目录下，项目根目录是 models/ 的父目录
-            project_root = os.path.dirname(os.path.dirname(current_file))
-            default_path = os.path.join(project_root, 'data', 'literature.db')
-            _db_instance = SimpleDatabase(default_path)
-    return _db_instance
+    if _db_instance is not None and not db_path:
+        return _db_instance
+    
+    # 与 SimpleDatabase.__init__ 相同的方式解析为绝对路径后再比较
+    abs_path = _resolve_db_path(db_path or os.path.join('data', 'literature.db'))
+    instance = _db_instance
+    if instance is None or instance.db_path != abs_path:
+        with _db_instances_lock:
+            instance = _db_instances.get(abs_path)
+            if instance is None:
+                instance = _db_instances[abs_path] = SimpleDatabase(abs_path)
+        _db_instance = instance
+    return instance
 
 if __name__ == '__main__':
     db = SimpleDatabase()
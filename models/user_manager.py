@@ -4,24 +4,77 @@
 使用SQLAlchemy ORM替代JSON文件存储
 """
 
+import functools
 import hashlib
+import hmac
 import secrets
-import random
+import sqlite3
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
 from models.adapter import get_db_session, User, Session
+from models.simple_db import get_db
 from utils.encryption import get_encryption_manager
+from utils.json_utils import json_loads
+
+# 导入服务器配置
+try:
+    from config import PASSWORD_CONFIG
+    PBKDF2_ITERATIONS = PASSWORD_CONFIG['pbkdf2_iterations']
+except ImportError:
+    PBKDF2_ITERATIONS = 100000
+
+# Try to import argon2, fallback to PBKDF2 if not available
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHash, VerificationError
+    ARGON2_AVAILABLE = True
+    _password_hasher = PasswordHasher()
+except ImportError:
+    ARGON2_AVAILABLE = False
 
 AVATAR_EMOJIS = ['🐶', '🐱', '🐭', '🐹', '🐰', '🦊', '🐻', '🐼', '🐨', '🐯', '🦁', '🐮', '🐷', '🐸', '🐵', '🐔', '🐧', '🐦', '🐤', '🦆', '🦅', '🦉', '🦇', '🐺', '🐗', '🐴', '🦄', '🐝', '🐛', '🦋', '🐌', '🐞', '🐜', '🦟', '🦗', '🕷', '🦂', '🐢', '🐍', '🦎', '🦖', '🦕', '🐙', '🦑', '🦐', '🦞', '🦀', '🐡', '🐠', '🐟', '🐬', '🐳', '🦈', '🐊', '🐅', '🐆', '🦓', '🦍', '🦧', '🐘', '🦛', '🦏', '🐪', '🐫', '🦒', '🦘', '🦬', '🐃', '🐂', '🐄', '🐎', '🐖', '🐏', '🐑', '🦙', '🐐', '🦌', '🐕', '🐩', '🦮', '🐕‍🦺', '🐈', '🐓', '🦃', '🦚', '🦜', '🦢', '🦩', '🕊', '🐇', '🦝', '🦨', '🦡', '🦫', '🦦', '🦥', '🐁', '🐀', '🐿', '🦔']
 
+# 单字节哈希值 -> 头像字符串的查找表（模块加载时构建一次）
+_EMOJI_LUT = tuple(f"emoji:{AVATAR_EMOJIS[i % len(AVATAR_EMOJIS)]}" for i in range(256))
+
+@functools.lru_cache(maxsize=1024)
 def generate_avatar(username: str) -> str:
     """生成用户头像 - 使用Emoji（本地，无需网络）"""
     # 根据用户名hash选择固定的emoji，保证同一用户名显示相同头像
-    hash_val = int(hashlib.md5(username.encode()).hexdigest(), 16)
-    emoji = AVATAR_EMOJIS[hash_val % len(AVATAR_EMOJIS)]
+    # 仅用于分桶（非密码学用途），取 BLAKE2b 1 字节摘要直接查表
     # 返回特殊格式，前端渲染为emoji
-    return f"emoji:{emoji}"
+    return _EMOJI_LUT[hashlib.blake2b(username.encode(), digest_size=1).digest()[0]]
+
+# 用户名或邮箱登录：两列各自走索引（OR 优化为多索引查找），同时命中时用户名优先
+_FIND_USER_BY_LOGIN_SQL = '''
+    SELECT * FROM users WHERE username = ? OR email = ?
+    ORDER BY username = ? DESC LIMIT 1
+'''
+
+# 关键词分布：按小写关键词分组；original 取组内 id 最小（最早写入）的原始写法
+# （SQLite 中与 MIN() 同时出现的裸列取自 MIN 所在的行）
+_KEYWORD_DISTRIBUTION_SQL = '''
+    SELECT lower(keyword), keyword, COUNT(*), group_concat(user_id), MIN(id)
+    FROM user_keywords
+    GROUP BY lower(keyword)
+'''
+
+# 管理员用户列表：json_valid 防止个别损坏的 preferences 让整条查询报错
+_ALL_USERS_SQL = '''
+    SELECT id, username, email,
+           CASE WHEN json_valid(preferences) THEN json_extract(preferences, '$.keywords') END,
+           created_at, last_login, is_active, is_admin, avatar
+    FROM users
+'''
+
+# 会话校验（每个已登录请求都会调用）：一条 JOIN 只取需要的列，不构造 Session/User 对象
+_VALIDATE_SESSION_SQL = '''
+    SELECT s.expires_at, u.id, u.username, u.email, u.preferences, u.is_admin, u.is_active
+    FROM sessions s JOIN users u ON u.id = s.user_id
+    WHERE s.id = ?
+'''
 
 class UserManager:
     """用户管理器 - 处理用户注册、登录和个性化设置"""
@@ -29,21 +82,82 @@ class UserManager:
     def __init__(self, db_path='data/literature.db'):
         self.db_path = db_path
     
-    def _get_session(self):
-        """获取数据库会话"""
-        return get_db_session(self.db_path)
+    @contextmanager
+    def _session(self):
+        """
+        数据库会话上下文：异常时回滚未提交的修改，退出时关闭会话
+        
+        不自动提交：方法中途返回错误结果时，已 add 的对象不应被写入
+        """
+        db = get_db_session(self.db_path)
+        try:
+            yield db
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
     
-    def _hash_password(self, password: str, salt: str = None) -> tuple:
-        """哈希密码"""
-        if salt is None:
-            salt = secrets.token_hex(16)
-        pwdhash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-        return pwdhash.hex(), salt
+    def _hash_password(self, password: str) -> tuple:
+        """
+        哈希密码，返回 (哈希串, salt)
+        
+        优先使用 argon2id（盐内嵌在哈希串中，salt 列存空串）；
+        未安装 argon2 时使用 PBKDF2-SHA512，哈希串格式为 pbkdf2_sha512$<迭代次数>$<hex>
+        """
+        if ARGON2_AVAILABLE:
+            return _password_hasher.hash(password), ''
+        salt = secrets.token_hex(16)
+        pwdhash = hashlib.pbkdf2_hmac('sha512', password.encode(), salt.encode(), PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha512${PBKDF2_ITERATIONS}${pwdhash.hex()}", salt
     
     def _verify_password(self, password: str, hashed: str, salt: str) -> bool:
-        """验证密码"""
-        pwdhash, _ = self._hash_password(password, salt)
-        return pwdhash == hashed
+        """验证密码（按哈希串前缀分派算法）"""
+        if not hashed:
+            return False
+        if hashed.startswith('$argon2'):
+            if not ARGON2_AVAILABLE:
+                return False
+            try:
+                return _password_hasher.verify(hashed, password)
+            except (VerificationError, InvalidHash):
+                return False
+        # PBKDF2 摘要使用常量时间比较，避免按匹配前缀长度泄露时序信息
+        if hashed.startswith('pbkdf2_sha512$'):
+            _, iterations, expected = hashed.split('$', 2)
+            candidate = hashlib.pbkdf2_hmac('sha512', password.encode(), salt.encode(), int(iterations)).hex()
+            return hmac.compare_digest(candidate, expected)
+        # 无前缀：旧版 PBKDF2-SHA256（100000 次迭代）
+        candidate = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000).hex()
+        return hmac.compare_digest(candidate, hashed)
+    
+    def _needs_rehash(self, hashed: str) -> bool:
+        """已验证的哈希是否应升级为当前算法/参数"""
+        if ARGON2_AVAILABLE:
+            if not hashed.startswith('$argon2'):
+                return True
+            return _password_hasher.check_needs_rehash(hashed)
+        return not hashed.startswith(f"pbkdf2_sha512${PBKDF2_ITERATIONS}$")
+    
+    def _sync_user_keywords(self, user_id: str, keywords: List[str]):
+        """用一个事务重写用户在 user_keywords 表中的关键词"""
+        get_db(self.db_path).execute_batch([
+            ("DELETE FROM user_keywords WHERE user_id = ?", [(user_id,)]),
+            ("INSERT INTO user_keywords (user_id, keyword) VALUES (?, ?)",
+             [(user_id, keyword) for keyword in keywords]),
+        ])
+    
+    def _find_user_by_login(self, username_or_email: str) -> Optional[User]:
+        """按用户名或邮箱查找用户（一条 OR 查询，用户名匹配优先）"""
+        row = get_db(self.db_path).fetchone_row(
+            _FIND_USER_BY_LOGIN_SQL, (username_or_email, username_or_email, username_or_email)
+        )
+        if row is None:
+            return None
+        user = User.from_row(row)
+        user.is_active = bool(user.is_active)
+        user.is_admin = bool(user.is_admin)
+        return user
     
     def register_user(self, username: str, email: str, password: str, 
                      keywords: List[str] = None) -> Dict:
@@ -58,224 +172,197 @@ class UserManager:
         """
         注册用户（带安全问题）
         """
-        db = self._get_session()
-        try:
-            # 检查用户名是否已存在
-            existing_user = db.query(User).filter_by(username=username.lower()).first()
-            if not existing_user:
-                existing_user = db.query(User).filter_by(email=email.lower()).first()
-            
-            if existing_user:
-                if existing_user.username.lower() == username.lower():
-                    return {'success': False, 'error': '用户名已存在'}
-                else:
-                    return {'success': False, 'error': '邮箱已被注册'}
-            
-            # 创建新用户
-            user_id = f"user_{int(datetime.now().timestamp())}_{secrets.token_hex(4)}"
-            pwd_hash, salt = self._hash_password(password)
-            avatar_url = generate_avatar(username)
-            
-            # 处理安全问题
-            security_answer_hash = None
-            security_answer_salt = None
-            if security_question and security_answer:
-                security_answer_hash, security_answer_salt = self._hash_password(security_answer)
-            
-            new_user = User(
-                id=user_id,
-                username=username,
-                email=email,
-                password_hash=pwd_hash,
-                password_salt=salt,
-                security_question=security_question,
-                security_answer_hash=security_answer_hash,
-                security_answer_salt=security_answer_salt,
-                is_active=True,
-                is_admin=False,
-                created_at=datetime.now(),
-                last_login=None,
-                preferences={
-                    'min_score_threshold': 0.3,
-                    'paper_types': ['research', 'review'],
-                    'sources': ['pubmed', 'biorxiv', 'medrxiv'],
-                    'daily_limit': 20,
-                    'email_notifications': True,
-                    'keywords': keywords or []  # 存储在preferences中
-                },
-                avatar=avatar_url
-            )
-            
-            db.add(new_user)
-            db.commit()
-            
-            return {
-                'success': True,
-                'user_id': user_id,
-                'username': username,
-                'message': '注册成功'
-            }
-            
-        except Exception as e:
-            db.rollback()
-            return {'success': False, 'error': f'注册失败: {str(e)}'}
-        finally:
-            db.close()
+        with self._session() as db:
+            try:
+                # 创建新用户
+                user_id = f"user_{int(datetime.now().timestamp())}_{secrets.token_hex(4)}"
+                pwd_hash, salt = self._hash_password(password)
+                avatar_url = generate_avatar(username)
+                
+                # 处理安全问题
+                security_answer_hash = None
+                security_answer_salt = None
+                if security_question and security_answer:
+                    security_answer_hash, security_answer_salt = self._hash_password(security_answer)
+                
+                new_user = User(
+                    id=user_id,
+                    username=username,
+                    email=email,
+                    password_hash=pwd_hash,
+                    password_salt=salt,
+                    security_question=security_question,
+                    security_answer_hash=security_answer_hash,
+                    security_answer_salt=security_answer_salt,
+                    is_active=True,
+                    is_admin=False,
+                    created_at=datetime.now(),
+                    last_login=None,
+                    preferences={
+                        'min_score_threshold': 0.3,
+                        'paper_types': ['research', 'review'],
+                        'sources': ['pubmed', 'biorxiv', 'medrxiv'],
+                        'daily_limit': 20,
+                        'email_notifications': True,
+                        'keywords': keywords or []  # 存储在preferences中
+                    },
+                    avatar=avatar_url
+                )
+                
+                # 用户名/邮箱唯一性由 lower() 唯一索引保证：直接插入，冲突时再查一次确定是哪一列
+                db.add(new_user)
+                try:
+                    db.commit()
+                except sqlite3.IntegrityError:
+                    username_taken = get_db(self.db_path).exists(
+                        "SELECT 1 FROM users WHERE lower(username) = ? LIMIT 1", (username.lower(),))
+                    return {'success': False, 'error': '用户名已存在' if username_taken else '邮箱已被注册'}
+                self._sync_user_keywords(user_id, keywords or [])
+                
+                return {
+                    'success': True,
+                    'user_id': user_id,
+                    'username': username,
+                    'message': '注册成功'
+                }
+                
+            except Exception as e:
+                return {'success': False, 'error': f'注册失败: {str(e)}'}
     
     def get_security_question(self, username_or_email: str) -> Dict:
         """获取用户的安全问题"""
-        db = self._get_session()
-        try:
-            # 查找用户
-            user = db.query(User).filter_by(username=username_or_email).first()
-            if not user:
-                user = db.query(User).filter_by(email=username_or_email).first()
-            
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            if not user.security_question:
-                return {'success': False, 'error': '该用户未设置安全问题'}
-            
+        # 查找用户（用户名或邮箱）
+        user = self._find_user_by_login(username_or_email)
+        
+        if not user:
+            return {'success': False, 'error': '用户不存在'}
+        
+        if not user.security_question:
+            return {'success': False, 'error': '该用户未设置安全问题'}
+        
+        return {
+            'success': True,
+            'question': user.security_question,
+            'username': user.username
+        }
+    
+    def verify_security_answer(self, username_or_email: str, answer: str) -> Dict:
+        """验证安全问题答案"""
+        # 查找用户（用户名或邮箱）
+        user = self._find_user_by_login(username_or_email)
+        
+        if not user:
+            return {'success': False, 'error': '用户不存在'}
+        
+        if not user.security_answer_hash:
+            return {'success': False, 'error': '该用户未设置安全问题'}
+        
+        # 验证答案
+        if self._verify_password(answer, user.security_answer_hash, user.security_answer_salt):
             return {
                 'success': True,
-                'question': user.security_question,
+                'user_id': user.id,
                 'username': user.username
             }
-        finally:
-            db.close()
-    
-    def verify_security_answer(self, username_or_email: str, answer: str) -> Dict:
-        """验证安全问题答案"""
-        db = self._get_session()
-        try:
-            # 查找用户
-            user = db.query(User).filter_by(username=username_or_email).first()
-            if not user:
-                user = db.query(User).filter_by(email=username_or_email).first()
-            
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            if not user.security_answer_hash:
-                return {'success': False, 'error': '该用户未设置安全问题'}
-            
-            # 验证答案
-            if self._verify_password(answer, user.security_answer_hash, user.security_answer_salt):
-                return {
-                    'success': True,
-                    'user_id': user.id,
-                    'username': user.username
-                }
-            else:
-                return {'success': False, 'error': '答案不正确'}
-        finally:
-            db.close()
+        else:
+            return {'success': False, 'error': '答案不正确'}
     
     def reset_password(self, user_id: str, new_password: str) -> Dict:
         """重置用户密码"""
-        db = self._get_session()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            # 生成新密码哈希
-            pwd_hash, salt = self._hash_password(new_password)
-            user.password_hash = pwd_hash
-            user.password_salt = salt
-            
-            db.commit()
-            return {'success': True, 'message': '密码重置成功'}
-            
-        except Exception as e:
-            db.rollback()
-            return {'success': False, 'error': f'重置失败: {str(e)}'}
-        finally:
-            db.close()
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return {'success': False, 'error': '用户不存在'}
+                
+                # 生成新密码哈希
+                pwd_hash, salt = self._hash_password(new_password)
+                user.password_hash = pwd_hash
+                user.password_salt = salt
+                
+                db.commit()
+                return {'success': True, 'message': '密码重置成功'}
+                
+            except Exception as e:
+                return {'success': False, 'error': f'重置失败: {str(e)}'}
     
     def login(self, username_or_email: str, password: str, ip_address: str = None, 
               user_agent: str = None) -> Dict:
         """
         用户登录
         """
-        db = self._get_session()
-        try:
-            # 查找用户（支持用户名或邮箱）
-            # 先尝试用用户名查找
-            user = db.query(User).filter_by(username=username_or_email).first()
-            # 如果没找到，再用邮箱查找
-            if not user:
-                user = db.query(User).filter_by(email=username_or_email).first()
-            
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            if not user.is_active:
-                return {'success': False, 'error': '账号已被禁用'}
-            
-            # 验证密码
-            if not self._verify_password(password, user.password_hash, user.password_salt):
-                return {'success': False, 'error': '密码错误'}
-            
-            # 更新最后登录时间
-            user.last_login = datetime.now()
-            
-            # 创建会话
-            session_token = secrets.token_urlsafe(32)
-            expires_at = datetime.now() + timedelta(days=7)
-            
-            new_session = Session(
-                id=session_token,
-                user_id=user.id,
-                created_at=datetime.now(),
-                expires_at=expires_at,
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
-            
-            db.add(new_session)
-            db.commit()
-            
-            # 获取关键词（从preferences中）
-            keywords = user.preferences.get('keywords', [])
-            
-            return {
-                'success': True,
-                'session_token': session_token,
-                'user': {
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email,
-                    'keywords': keywords,
-                    'is_admin': user.is_admin
+        with self._session() as db:
+            try:
+                # 查找用户（支持用户名或邮箱）
+                user = self._find_user_by_login(username_or_email)
+                
+                if not user:
+                    return {'success': False, 'error': '用户不存在'}
+                
+                if not user.is_active:
+                    return {'success': False, 'error': '账号已被禁用'}
+                
+                # 验证密码
+                if not self._verify_password(password, user.password_hash, user.password_salt):
+                    return {'success': False, 'error': '密码错误'}
+                
+                # 旧版 PBKDF2 哈希在登录成功时透明升级
+                if self._needs_rehash(user.password_hash):
+                    user.password_hash, user.password_salt = self._hash_password(password)
+                
+                # 更新最后登录时间
+                user.last_login = datetime.now()
+                db.add(user)
+                
+                # 创建会话
+                session_token = secrets.token_urlsafe(32)
+                expires_at = datetime.now() + timedelta(days=7)
+                
+                new_session = Session(
+                    id=session_token,
+                    user_id=user.id,
+                    created_at=datetime.now(),
+                    expires_at=expires_at,
+                    ip_address=ip_address,
+                    user_agent=user_agent
+                )
+                
+                db.add(new_session)
+                db.commit()
+                
+                # 获取关键词（从preferences中）
+                keywords = user.preferences.get('keywords', [])
+                
+                return {
+                    'success': True,
+                    'session_token': session_token,
+                    'user': {
+                        'id': user.id,
+                        'username': user.username,
+                        'email': user.email,
+                        'keywords': keywords,
+                        'is_admin': user.is_admin
+                    }
                 }
-            }
-            
-        except Exception as e:
-            db.rollback()
-            return {'success': False, 'error': f'登录失败: {str(e)}'}
-        finally:
-            db.close()
+                
+            except Exception as e:
+                return {'success': False, 'error': f'登录失败: {str(e)}'}
     
     def logout(self, session_token: str) -> bool:
         """登出用户"""
         if not session_token:
             return False
             
-        db = self._get_session()
-        try:
-            session = db.query(Session).filter(Session.id == session_token).first()
-            if session:
-                db.delete(session)
-                db.commit()
-                return True
-            return False
-        except Exception as e:
-            db.rollback()
-            return False
-        finally:
-            db.close()
+        with self._session() as db:
+            try:
+                session = db.query(Session).filter(Session.id == session_token).first()
+                if session:
+                    db.delete(session)
+                    db.commit()
+                    return True
+                return False
+            except Exception as e:
+                return False
     
     def validate_session(self, session_token: str) -> Optional[Dict]:
         """
@@ -283,43 +370,38 @@ class UserManager:
         """
         if not session_token:
             return None
-            
-        db = self._get_session()
+        
+        simple_db = get_db(self.db_path)
+        row = simple_db.fetchone_row(_VALIDATE_SESSION_SQL, (session_token,))
+        if row is None:
+            return None
+        expires_at, user_id, username, email, preferences, is_admin, is_active = row
+        
+        # 检查是否过期
+        if not expires_at or datetime.now() > datetime.fromisoformat(expires_at):
+            simple_db.execute("DELETE FROM sessions WHERE id = ?", (session_token,))
+            return None
+        
+        if not is_active:
+            return None
+        
         try:
-            session = db.query(Session).filter(Session.id == session_token).first()
-            
-            if not session:
-                return None
-            
-            # 检查是否过期
-            if datetime.now() > session.expires_at:
-                db.delete(session)
-                db.commit()
-                return None
-            
-            user = session.user
-            if not user or not user.is_active:
-                return None
-            
-            # 获取关键词
-            keywords = user.preferences.get('keywords', [])
-            
-            return {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'keywords': keywords,
-                'preferences': user.preferences,
-                'is_admin': user.is_admin
-            }
-            
-        finally:
-            db.close()
+            preferences = json_loads(preferences) if preferences else {}
+        except ValueError:
+            preferences = {}
+        
+        return {
+            'id': user_id,
+            'username': username,
+            'email': email,
+            'keywords': preferences.get('keywords', []),
+            'preferences': preferences,
+            'is_admin': bool(is_admin)
+        }
     
     def get_user(self, user_id: str) -> Optional[Dict]:
         """获取用户信息"""
-        db = self._get_session()
-        try:
+        with self._session() as db:
             user = db.query(User).filter_by(id=user_id).first()
             if not user:
                 return None
@@ -337,13 +419,10 @@ class UserManager:
                 'created_at': user.created_at.isoformat() if hasattr(user.created_at, 'isoformat') else user.created_at,
                 'last_login': user.last_login.isoformat() if hasattr(user.last_login, 'isoformat') else user.last_login
             }
-        finally:
-            db.close()
 
     def get_user_by_username(self, username: str) -> Optional[Dict]:
         """通过用户名获取用户信息"""
-        db = self._get_session()
-        try:
+        with self._session() as db:
             user = db.query(User).filter_by(username=username).first()
             if not user:
                 return None
@@ -359,13 +438,10 @@ class UserManager:
                 'created_at': user.created_at.isoformat() if hasattr(user.created_at, 'isoformat') else user.created_at,
                 'last_login': user.last_login.isoformat() if hasattr(user.last_login, 'isoformat') else user.last_login
             }
-        finally:
-            db.close()
 
     def get_user_by_email(self, email: str) -> Optional[Dict]:
         """通过邮箱获取用户信息"""
-        db = self._get_session()
-        try:
+        with self._session() as db:
             user = db.query(User).filter_by(email=email).first()
             if not user:
                 return None
@@ -381,162 +457,165 @@ class UserManager:
                 'created_at': user.created_at.isoformat() if hasattr(user.created_at, 'isoformat') else user.created_at,
                 'last_login': user.last_login.isoformat() if hasattr(user.last_login, 'isoformat') else user.last_login
             }
-        finally:
-            db.close()
 
     def update_keywords(self, user_id: str, keywords: List[str]) -> Dict:
         """更新用户关键词"""
-        db = self._get_session()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            # 更新preferences中的keywords
-            prefs = user.preferences or {}
-            prefs['keywords'] = keywords
-            user.preferences = prefs
-            
-            db.commit()
-            return {'success': True, 'message': '关键词已更新'}
-            
-        except Exception as e:
-            db.rollback()
-            return {'success': False, 'error': f'更新失败: {str(e)}'}
-        finally:
-            db.close()
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return {'success': False, 'error': '用户不存在'}
+                
+                # 更新preferences中的keywords（原地修改，commit 时自动检测并写回）
+                user.preferences['keywords'] = keywords
+                db.commit()
+                self._sync_user_keywords(user_id, keywords)
+                return {'success': True, 'message': '关键词已更新'}
+                
+            except Exception as e:
+                return {'success': False, 'error': f'更新失败: {str(e)}'}
     
     def update_preferences(self, user_id: str, preferences: Dict) -> Dict:
         """更新用户偏好设置"""
-        db = self._get_session()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            # 合并偏好设置
-            current_prefs = user.preferences or {}
-            current_prefs.update(preferences)
-            user.preferences = current_prefs
-            
-            # 添加到待保存列表并提交
-            db.add(user)
-            db.commit()
-            return {'success': True, 'message': '偏好设置已更新'}
-            
-        except Exception as e:
-            db.rollback()
-            return {'success': False, 'error': f'更新失败: {str(e)}'}
-        finally:
-            db.close()
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return {'success': False, 'error': '用户不存在'}
+                
+                # 合并偏好设置
+                current_prefs = user.preferences
+                current_prefs.update(preferences)
+                db.commit()
+                if 'keywords' in preferences:
+                    self._sync_user_keywords(user_id, current_prefs['keywords'])
+                return {'success': True, 'message': '偏好设置已更新'}
+                
+            except Exception as e:
+                return {'success': False, 'error': f'更新失败: {str(e)}'}
+    
+    def update_user(self, user_id: str, updates: Dict) -> Dict:
+        """
+        更新用户基本信息（管理员用）
+        
+        Args:
+            updates: 可包含 username、email、keywords、is_admin，其他字段忽略
+        """
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return {'success': False, 'error': '用户不存在'}
+                
+                if 'username' in updates:
+                    user.username = updates['username']
+                if 'email' in updates:
+                    user.email = updates['email']
+                if 'is_admin' in updates:
+                    user.is_admin = bool(updates['is_admin'])
+                if 'keywords' in updates:
+                    user.preferences['keywords'] = updates['keywords']
+                
+                try:
+                    db.commit()
+                except sqlite3.IntegrityError:
+                    return {'success': False, 'error': '用户名或邮箱已被使用'}
+                if 'keywords' in updates:
+                    self._sync_user_keywords(user_id, updates['keywords'])
+                return {'success': True, 'message': '用户信息已更新'}
+                
+            except Exception as e:
+                return {'success': False, 'error': f'更新失败: {str(e)}'}
     
     def get_all_users(self) -> List[Dict]:
         """获取所有用户（管理员用）"""
-        db = self._get_session()
-        try:
-            users = db.query(User).all()
-            return [
-                {
-                    'id': u.id,
-                    'username': u.username,
-                    'email': u.email,
-                    'keywords': u.preferences.get('keywords', []) if hasattr(u, 'preferences') and u.preferences else [],
-                    'created_at': u.created_at.isoformat() if hasattr(u.created_at, 'isoformat') else u.created_at,
-                    'last_login': u.last_login.isoformat() if hasattr(u.last_login, 'isoformat') else u.last_login,
-                    'is_active': u.is_active,
-                    'is_admin': u.is_admin,
-                    'avatar': u.avatar or ''
-                }
-                for u in users
-            ]
-        finally:
-            db.close()
+        # 只投影需要的列；keywords 由 SQLite 的 json_extract 从 preferences 中取出，不解析整个 JSON
+        rows = get_db(self.db_path).fetchall_rows(_ALL_USERS_SQL)
+        return [
+            {
+                'id': user_id,
+                'username': username,
+                'email': email,
+                'keywords': json_loads(keywords) if keywords else [],
+                'created_at': created_at,
+                'last_login': last_login,
+                'is_active': bool(is_active),
+                'is_admin': bool(is_admin),
+                'avatar': avatar or ''
+            }
+            for user_id, username, email, keywords, created_at, last_login, is_active, is_admin, avatar in rows
+        ]
+    
+    def get_all_user_preferences(self) -> Dict[str, Dict]:
+        """获取所有用户的偏好设置（user_id -> preferences），供启动时批量读取设置"""
+        preferences = {}
+        for user_id, raw in get_db(self.db_path).fetchall_rows("SELECT id, preferences FROM users"):
+            try:
+                preferences[user_id] = json_loads(raw) if raw else {}
+            except ValueError:
+                preferences[user_id] = {}
+        return preferences
     
     def get_keyword_distribution(self) -> Dict:
-        """获取所有用户的关键词分布"""
-        db = self._get_session()
-        try:
-            users = db.query(User).all()
-            keyword_count = {}
-            
-            for user in users:
-                keywords = user.preferences.get('keywords', [])
-                for keyword in keywords:
-                    kw_lower = keyword.lower()
-                    if kw_lower not in keyword_count:
-                        keyword_count[kw_lower] = {
-                            'count': 0,
-                            'original': keyword,
-                            'users': []
-                        }
-                    keyword_count[kw_lower]['count'] += 1
-                    keyword_count[kw_lower]['users'].append(user.id)
-            
-            return keyword_count
-        finally:
-            db.close()
+        """获取所有用户的关键词分布（在 user_keywords 表上按小写关键词聚合）"""
+        rows = get_db(self.db_path).fetchall_rows(_KEYWORD_DISTRIBUTION_SQL)
+        return {
+            kw_lower: {
+                'count': count,
+                'original': original,
+                'users': user_ids.split(',')
+            }
+            for kw_lower, original, count, user_ids, _ in rows
+        }
     
     def cleanup_expired_sessions(self) -> int:
-        """清理过期会话"""
-        db = self._get_session()
+        """清理过期会话（单条 DELETE，按 expires_at 索引范围扫描）"""
         try:
-            expired = db.query(Session).filter(Session.expires_at < datetime.now()).all()
-            count = len(expired)
-            
-            for session in expired:
-                db.delete(session)
-            
-            db.commit()
-            return count
+            # expires_at 以 ISO 字符串存储，字符串比较即时间比较
+            return get_db(self.db_path).execute_rowcount(
+                "DELETE FROM sessions WHERE expires_at < ?", (datetime.now().isoformat(),)
+            )
         except Exception as e:
-            db.rollback()
+            print(f"⚠️ 清理过期会话失败: {e}")
             return 0
-        finally:
-            db.close()
     
     def set_admin(self, user_id: str, is_admin: bool = True) -> bool:
         """设置用户管理员权限"""
-        db = self._get_session()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user:
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return False
+                
+                user.is_admin = is_admin
+                db.commit()
+                return True
+            except Exception as e:
                 return False
-            
-            user.is_admin = is_admin
-            db.commit()
-            return True
-        except Exception as e:
-            db.rollback()
-            return False
-        finally:
-            db.close()
     
     def delete_user(self, user_id: str) -> bool:
         """删除用户"""
-        db = self._get_session()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user:
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return False
+                
+                db.delete(user)
+                db.commit()
+                self._sync_user_keywords(user_id, [])
+                return True
+            except Exception as e:
                 return False
-            
-            db.delete(user)
-            db.commit()
-            return True
-        except Exception as e:
-            db.rollback()
-            return False
-        finally:
-            db.close()
     
     def get_user_settings(self, user_id: str) -> Optional[Dict]:
         """获取用户设置（不含敏感信息）"""
-        db = self._get_session()
-        try:
+        with self._session() as db:
             user = db.query(User).filter_by(id=user_id).first()
             if not user:
                 return None
             
-            prefs = user.preferences or {}
+            prefs = user.preferences
             return {
                 'api_provider': prefs.get('api_provider', 'deepseek'),
                 'api_base_url': prefs.get('api_base_url', ''),
@@ -546,147 +625,110 @@ class UserManager:
                 'model': prefs.get('model', 'deepseek-chat'),
                 'sources': prefs.get('sources', ['pubmed', 'biorxiv', 'medrxiv'])
             }
-        finally:
-            db.close()
     
     def save_user_api_settings(self, user_id: str, api_settings: Dict) -> Dict:
         """保存用户API设置（API Key会被加密存储）"""
-        db = self._get_session()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            # 解析 preferences 为字典
-            prefs = user.preferences
-            if isinstance(prefs, str):
-                prefs = json.loads(prefs) if prefs else {}
-            elif not prefs:
-                prefs = {}
-            
-            # 获取加密管理器
-            encryption = get_encryption_manager()
-            
-            # 更新API相关设置
-            if 'api_provider' in api_settings:
-                prefs['api_provider'] = api_settings['api_provider']
-            if 'api_key' in api_settings and api_settings['api_key']:
-                # 加密存储API Key
-                prefs['api_key'] = encryption.encrypt(api_settings['api_key'])
-            if 'api_base_url' in api_settings:
-                prefs['api_base_url'] = api_settings['api_base_url']
-            if 'model' in api_settings:
-                prefs['model'] = api_settings['model']
-            
-            # 先添加到 pending 列表，这样 commit 才会保存
-            db.add(user)
-            user.preferences = prefs
-            db.commit()
-            
-            return {'success': True, 'message': 'API设置已保存（已加密）'}
-            
-        except Exception as e:
-            db.rollback()
-            return {'success': False, 'error': f'保存失败: {str(e)}'}
-        finally:
-            db.close()
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return {'success': False, 'error': '用户不存在'}
+                
+                # preferences 已由模型解析为字典（每个实例只解析一次），直接原地修改
+                prefs = user.preferences
+                
+                # 获取加密管理器
+                encryption = get_encryption_manager()
+                
+                # 更新API相关设置
+                if 'api_provider' in api_settings:
+                    prefs['api_provider'] = api_settings['api_provider']
+                if 'api_key' in api_settings and api_settings['api_key']:
+                    # 加密存储API Key
+                    prefs['api_key'] = encryption.encrypt(api_settings['api_key'])
+                if 'api_base_url' in api_settings:
+                    prefs['api_base_url'] = api_settings['api_base_url']
+                if 'model' in api_settings:
+                    prefs['model'] = api_settings['model']
+                
+                db.commit()
+                
+                return {'success': True, 'message': 'API设置已保存（已加密）'}
+                
+            except Exception as e:
+                return {'success': False, 'error': f'保存失败: {str(e)}'}
     
     def get_user_api_key(self, user_id: str) -> Optional[str]:
         """获取用户加密的API Key（自动解密）"""
-        db = self._get_session()
-        try:
+        with self._session() as db:
             user = db.query(User).filter_by(id=user_id).first()
             if not user:
                 return None
             
-            encrypted_key = None
-            if isinstance(user.preferences, dict):
-                encrypted_key = user.preferences.get('api_key')
-            elif user.preferences:
-                # 尝试解析JSON
-                try:
-                    prefs = json.loads(user.preferences) if isinstance(user.preferences, str) else user.preferences
-                    encrypted_key = prefs.get('api_key')
-                except:
-                    pass
-            
+            encrypted_key = user.preferences.get('api_key')
             if not encrypted_key:
                 return None
             
             # 解密API Key
             encryption = get_encryption_manager()
             return encryption.decrypt(encrypted_key)
-        finally:
-            db.close()
     
     def save_user_update_settings(self, user_id: str, settings: Dict) -> Dict:
         """保存用户更新频率设置"""
-        db = self._get_session()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            prefs = user.preferences or {}
-            
-            if 'update_frequency_days' in settings:
-                prefs['update_frequency_days'] = max(1, min(30, int(settings['update_frequency_days'])))
-            if 'max_auto_analyze' in settings:
-                prefs['max_auto_analyze'] = max(1, min(50, int(settings['max_auto_analyze'])))
-            
-            user.preferences = prefs
-            db.commit()
-            
-            return {'success': True, 'message': '更新设置已保存'}
-            
-        except Exception as e:
-            db.rollback()
-            return {'success': False, 'error': f'保存失败: {str(e)}'}
-        finally:
-            db.close()
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return {'success': False, 'error': '用户不存在'}
+                
+                prefs = user.preferences
+                
+                if 'update_frequency_days' in settings:
+                    prefs['update_frequency_days'] = max(1, min(30, int(settings['update_frequency_days'])))
+                if 'max_auto_analyze' in settings:
+                    prefs['max_auto_analyze'] = max(1, min(50, int(settings['max_auto_analyze'])))
+                
+                db.commit()
+                
+                return {'success': True, 'message': '更新设置已保存'}
+                
+            except Exception as e:
+                return {'success': False, 'error': f'保存失败: {str(e)}'}
     
     def get_user_sources(self, user_id: str) -> List[str]:
         """获取用户选择的文献源"""
-        db = self._get_session()
-        try:
+        with self._session() as db:
             user = db.query(User).filter_by(id=user_id).first()
             if not user:
                 return ['pubmed', 'biorxiv', 'medrxiv']
             
-            prefs = user.preferences or {}
+            prefs = user.preferences
             return prefs.get('sources', ['pubmed', 'biorxiv', 'medrxiv'])
-        finally:
-            db.close()
     
     def save_user_sources(self, user_id: str, sources: List[str]) -> Dict:
         """保存用户选择的文献源"""
-        db = self._get_session()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user:
-                return {'success': False, 'error': '用户不存在'}
-            
-            # 验证源
-            from v1.fetcher import PaperFetcher
-            available = list(PaperFetcher.PAPER_SOURCES.keys())
-            valid_sources = [s for s in sources if s in available]
-            
-            # 至少选择一个源
-            if not valid_sources:
-                valid_sources = ['pubmed']
-            
-            prefs = user.preferences or {}
-            prefs['sources'] = valid_sources
-            user.preferences = prefs
-            db.commit()
-            
-            return {'success': True, 'message': '文献源设置已保存'}
-            
-        except Exception as e:
-            db.rollback()
-            return {'success': False, 'error': f'保存失败: {str(e)}'}
-        finally:
-            db.close()
+        with self._session() as db:
+            try:
+                user = db.query(User).filter_by(id=user_id).first()
+                if not user:
+                    return {'success': False, 'error': '用户不存在'}
+                
+                # 验证源
+                from v1.fetcher import PaperFetcher
+                available = list(PaperFetcher.PAPER_SOURCES.keys())
+                valid_sources = [s for s in sources if s in available]
+                
+                # 至少选择一个源
+                if not valid_sources:
+                    valid_sources = ['pubmed']
+                
+                user.preferences['sources'] = valid_sources
+                db.commit()
+                
+                return {'success': True, 'message': '文献源设置已保存'}
+                
+            except Exception as e:
+                return {'success': False, 'error': f'保存失败: {str(e)}'}
 
     @property
     def users(self) -> Dict:
@@ -762,6 +804,9 @@ PREDEFINED_KEYWORDS = {
     }
 }
 
+# 各分类关键词的不可变集合（模块加载时构建一次），展开时直接求并集去重
+_CATEGORY_SETS = {k: frozenset(v['keywords']) for k, v in PREDEFINED_KEYWORDS.items()}
+
 
 def get_predefined_categories() -> Dict:
     """获取预设的关键词分类"""
@@ -772,8 +817,4 @@ def expand_keywords(selected_categories: List[str]) -> List[str]:
     """
     根据选择的分类展开关键词列表
     """
-    keywords = []
-    for category in selected_categories:
-        if category in PREDEFINED_KEYWORDS:
-            keywords.extend(PREDEFINED_KEYWORDS[category]['keywords'])
-    return list(set(keywords))  # 去重
+    return list(frozenset().union(*(_CATEGORY_SETS[c] for c in selected_categories if c in _CATEGORY_SETS)))
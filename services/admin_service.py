@@ -4,12 +4,57 @@
 包括：用户管理、系统监控、文献管理、系统配置
 """
 
-import json
 import os
+import threading
 import time
-from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
+from models.simple_db import get_db
+from utils.json_utils import json_dump_file, json_dumps, json_load_file, json_loads
+
+# 系统资源监控（可选依赖）
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# 操作日志保留条数；日志文件超过 _LOG_ROTATE_BYTES 时截断为最近的 _MAX_LOG_ENTRIES 条，
+# 且截断后不超过 _LOG_TRIM_BYTES（远低于阈值，条目较大时也不会每次追加都触发重写）
+_MAX_LOG_ENTRIES = 1000
+_LOG_ROTATE_BYTES = 512 * 1024
+_LOG_TRIM_BYTES = _LOG_ROTATE_BYTES // 2
+
+# 用户统计：一次扫描在 SQLite 中完成全部计数
+# last_login 为 ISO 字符串，按字符串比较即按时间比较（今天的日期前缀 'YYYY-MM-DD' 即当天零点）
+_USER_STATS_SQL = '''
+    SELECT COUNT(*),
+           COALESCE(SUM(is_admin), 0),
+           COALESCE(SUM(last_login >= ?), 0),
+           COALESCE(SUM(last_login >= ?), 0)
+    FROM users
+'''
+
+# 通过邮箱认定的管理员
+_ADMIN_EMAILS = frozenset(('admin@example.com', 'caolongzhi@example.com'))
+
+# 管理后台轮询接口（用户列表、系统统计）的结果缓存时间（秒）
+_ADMIN_CACHE_TTL = 5
+
+# 管理后台用户列表：preferences 中的字段由 SQLite 的 JSON 函数取出，json_valid 防止损坏的数据让整条查询报错
+_ADMIN_USERS_SQL = '''
+    SELECT id, username, email, created_at, last_login,
+           CASE WHEN json_valid(preferences) THEN json_array_length(preferences, '$.keywords') END,
+           CASE WHEN json_valid(preferences) THEN json_extract(preferences, '$.sources') END,
+           CASE WHEN json_valid(preferences) THEN json_extract(preferences, '$.custom_sources') END,
+           is_admin, avatar
+    FROM users
+    ORDER BY created_at DESC
+'''
+
 class AdminManager:
     """后台管理器 - 处理管理员功能"""
     
@@ -18,23 +63,57 @@ class AdminManager:
         self.cache = cache
         self.user_manager = user_manager
         self.analyzer = analyzer
-        self.logs_file = os.path.join(data_dir, 'admin_logs.json')
+        # 操作日志为 JSONL（每行一条），记录时只追加一行
+        self.logs_file = os.path.join(data_dir, 'admin_logs.jsonl')
+        # 待写入的日志行；batched_logs() 期间只缓冲，退出时一次写入
+        self._log_buffer = []
+        self._log_batch_depth = 0
+        self._log_lock = threading.Lock()
         self.config_file = os.path.join(data_dir, 'admin_config.json')
         self._ensure_data_dir()
+        self._migrate_legacy_logs()
         self.config = self._load_config()
+        
+        # (生成时间, 结果)：按 time.monotonic() 判断是否过期
+        self._users_cache = (0.0, None)
+        self._stats_cache = (0.0, None)
+        # user_id -> (生成时间, 是否管理员)
+        self._is_admin_cache = {}
+        
+        # cpu_percent(interval=None) 返回距上次调用的 CPU 占用，先调用一次作为基准
+        if PSUTIL_AVAILABLE:
+            psutil.cpu_percent(interval=None)
     
     def _ensure_data_dir(self):
         """确保数据目录存在"""
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
     
+    def _migrate_legacy_logs(self):
+        """将旧版 admin_logs.json（整个 JSON 数组）转换为 JSONL"""
+        legacy_file = os.path.join(self.data_dir, 'admin_logs.json')
+        if not os.path.exists(legacy_file) or os.path.exists(self.logs_file):
+            return
+        try:
+            logs = json_load_file(legacy_file)
+        except (OSError, ValueError):
+            return
+        self._write_log_lines(json_dumps(entry) + '\n' for entry in logs[-_MAX_LOG_ENTRIES:])
+        os.remove(legacy_file)
+    
+    def _write_log_lines(self, lines):
+        """用给定的行原子地重写日志文件（先写临时文件再替换）"""
+        tmp_file = self.logs_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp_file, self.logs_file)
+    
     def _load_config(self) -> Dict:
         """加载管理员配置"""
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
+                return json_load_file(self.config_file)
+            except (OSError, ValueError):
                 return self._default_config()
         return self._default_config()
     
@@ -51,8 +130,7 @@ class AdminManager:
     def save_config(self, config: Dict):
         """保存配置"""
         config['last_updated'] = datetime.now().isoformat()
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        json_dump_file(config, self.config_file)
         self.config = config
     
     def get_config(self) -> Dict:
@@ -64,49 +142,47 @@ class AdminManager:
         if not user_id or not self.user_manager:
             return False
         
-        user = self.user_manager.users.get(user_id)
-        if not user:
-            return False
+        cached = self._is_admin_cache.get(user_id)
+        if cached is not None and time.monotonic() - cached[0] < _ADMIN_CACHE_TTL:
+            return cached[1]
+        
+        # 按主键只查询该用户，而不是加载全部用户
+        user = self.user_manager.get_user(user_id)
         
         # 检查是否为管理员（通过邮箱或特殊标记）
-        admin_emails = ['admin@example.com', 'caolongzhi@example.com']
-        return user.get('email') in admin_emails or user.get('is_admin', False)
+        result = bool(user) and (user.get('email') in _ADMIN_EMAILS or bool(user.get('is_admin', False)))
+        self._is_admin_cache[user_id] = (time.monotonic(), result)
+        return result
     
     def get_all_users(self) -> List[Dict]:
         """获取所有用户信息（管理员用）"""
         if not self.user_manager:
             return []
         
-        # 从数据库获取所有用户
-        db = self.user_manager._get_session()
-        try:
-            from models.adapter import User
-            users = db.query(User).all()
-            
-            users_list = []
-            for user in users:
-                keywords = user.preferences.get('keywords', []) if isinstance(user.preferences, dict) else []
-                sources = user.preferences.get('sources', []) if isinstance(user.preferences, dict) else []
-                custom_sources = user.preferences.get('custom_sources', '') if isinstance(user.preferences, dict) else ''
-                user_info = {
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email,
-                    'created_at': user.created_at.isoformat() if hasattr(user.created_at, 'isoformat') else user.created_at,
-                    'last_login': user.last_login.isoformat() if hasattr(user.last_login, 'isoformat') else user.last_login,
-                    'keywords_count': len(keywords),
-                    'sources': sources,
-                    'custom_sources': custom_sources,
-                    'is_admin': user.is_admin,
-                    'avatar': user.avatar or ''
-                }
-                users_list.append(user_info)
-            
-            # 按创建时间排序
-            users_list.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        cached_at, users_list = self._users_cache
+        if users_list is not None and time.monotonic() - cached_at < _ADMIN_CACHE_TTL:
             return users_list
-        finally:
-            db.close()
+        
+        # 一条查询只取需要的列，由数据库按创建时间倒序排序
+        rows = get_db(self.user_manager.db_path).fetchall_rows(_ADMIN_USERS_SQL)
+        users_list = [
+            {
+                'id': user_id,
+                'username': username,
+                'email': email,
+                'created_at': created_at,
+                'last_login': last_login,
+                'keywords_count': keywords_count or 0,
+                'sources': json_loads(sources) if sources else [],
+                'custom_sources': custom_sources or '',
+                'is_admin': bool(is_admin),
+                'avatar': avatar or ''
+            }
+            for (user_id, username, email, created_at, last_login,
+                 keywords_count, sources, custom_sources, is_admin, avatar) in rows
+        ]
+        self._users_cache = (time.monotonic(), users_list)
+        return users_list
     
     def get_user_details(self, user_id: str) -> Optional[Dict]:
         """获取用户详细信息"""
@@ -120,8 +196,8 @@ class AdminManager:
         prefs = user_data.get('preferences', {})
         if isinstance(prefs, str):
             try:
-                prefs = json.loads(prefs)
-            except:
+                prefs = json_loads(prefs)
+            except ValueError:
                 prefs = {}
         
         return {
@@ -141,19 +217,17 @@ class AdminManager:
         if not self.user_manager:
             return False
         
-        if user_id not in self.user_manager.users:
-            return False
-        
-        user = self.user_manager.users[user_id]
-        
         # 允许更新的字段
         allowed_fields = ['username', 'email', 'keywords', 'is_admin']
-        for field in allowed_fields:
-            if field in updates:
-                user[field] = updates[field]
+        result = self.user_manager.update_user(
+            user_id, {field: updates[field] for field in allowed_fields if field in updates}
+        )
+        if not result['success']:
+            return False
         
-        user['updated_at'] = datetime.now().isoformat()
-        self.user_manager._save_users()
+        self._users_cache = (0.0, None)
+        self._stats_cache = (0.0, None)
+        self._is_admin_cache.pop(user_id, None)
         
         # 记录日志
         self._log_action('update_user', {'user_id': user_id, 'updates': updates})
@@ -161,22 +235,37 @@ class AdminManager:
     
     def delete_user(self, user_id: str) -> bool:
         """删除用户"""
-        if not self.user_manager:
-            return False
+        return self.delete_users([user_id]) == 1
+    
+    def delete_users(self, user_ids: List[str]) -> int:
+        """
+        批量删除用户
         
-        if user_id not in self.user_manager.users:
-            return False
+        相关数据统一清理：会话一个事务删除，user_papers.json 只读写一次
+        
+        Returns:
+            实际删除的用户数
+        """
+        if not self.user_manager:
+            return 0
         
         # 删除用户数据
-        del self.user_manager.users[user_id]
-        self.user_manager._save_users()
+        deleted = [user_id for user_id in user_ids if self.user_manager.delete_user(user_id)]
+        if not deleted:
+            return 0
+        
+        self._users_cache = (0.0, None)
+        for user_id in deleted:
+            self._is_admin_cache.pop(user_id, None)
         
         # 清理用户相关数据
-        self._cleanup_user_data(user_id)
+        self._cleanup_user_data(deleted)
         
         # 记录日志
-        self._log_action('delete_user', {'user_id': user_id})
-        return True
+        with self.batched_logs():
+            for user_id in deleted:
+                self._log_action('delete_user', {'user_id': user_id})
+        return len(deleted)
     
     def reset_user_password(self, user_id: str, new_password: str) -> bool:
         """重置用户密码"""
@@ -189,42 +278,37 @@ class AdminManager:
         # 使用UserManager的密码重置功能
         return self.user_manager.reset_password(user_id, new_password)
     
-    def _cleanup_user_data(self, user_id: str):
+    def _cleanup_user_data(self, user_ids: List[str]):
         """清理用户相关数据"""
         # 清理用户会话
-        sessions_to_remove = []
-        for sid, session in self.user_manager.sessions.items():
-            if session.get('user_id') == user_id:
-                sessions_to_remove.append(sid)
-        
-        for sid in sessions_to_remove:
-            del self.user_manager.sessions[sid]
-        
-        self.user_manager._save_sessions()
+        get_db(self.user_manager.db_path).executemany(
+            "DELETE FROM sessions WHERE user_id = ?", [(user_id,) for user_id in user_ids])
         
         # 清理用户文献数据
         user_papers_file = os.path.join(self.data_dir, 'user_papers.json')
         if os.path.exists(user_papers_file):
             try:
-                with open(user_papers_file, 'r', encoding='utf-8') as f:
-                    user_papers = json.load(f)
-                
-                if user_id in user_papers:
-                    del user_papers[user_id]
+                user_papers = json_load_file(user_papers_file)
                 
-                with open(user_papers_file, 'w', encoding='utf-8') as f:
-                    json.dump(user_papers, f, ensure_ascii=False, indent=2)
-            except:
+                removed = [user_papers.pop(user_id) for user_id in user_ids if user_id in user_papers]
+                if removed:
+                    json_dump_file(user_papers, user_papers_file)
+            except (OSError, ValueError):
                 pass
     
     def get_system_stats(self) -> Dict:
-        """获取系统统计信息"""
+        """获取系统统计信息（短时间内的重复请求返回缓存结果）"""
+        cached_at, stats = self._stats_cache
+        if stats is not None and time.monotonic() - cached_at < _ADMIN_CACHE_TTL:
+            return stats
+        
         stats = {
             'users': self._get_user_stats(),
             'cache': self._get_cache_stats(),
             'api': self._get_api_stats(),
             'system': self._get_system_info()
         }
+        self._stats_cache = (time.monotonic(), stats)
         return stats
     
     def _get_user_stats(self) -> Dict:
@@ -232,17 +316,18 @@ class AdminManager:
         if not self.user_manager:
             return {}
         
-        users = self.user_manager.users
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        week_ago = (datetime.now() - __import__('datetime').timedelta(days=7)).isoformat()
+        now = datetime.now()
+        today_start = now.strftime('%Y-%m-%d')
+        week_ago = (now - timedelta(days=7)).isoformat()
+        
+        total_users, total_admins, active_today, active_this_week = get_db(
+            self.user_manager.db_path).fetchone_row(_USER_STATS_SQL, (today_start, week_ago))
         
         return {
-            'total_users': len(users),
-            'total_admins': sum(1 for u in users.values() if u.get('is_admin', False)),
-            'active_today': sum(1 for u in users.values() 
-                              if (u.get('last_login') or '').startswith(today_str)),
-            'active_this_week': sum(1 for u in users.values() 
-                                   if (u.get('last_login') or '') >= week_ago)
+            'total_users': total_users,
+            'total_admins': total_admins,
+            'active_today': active_today,
+            'active_this_week': active_this_week
         }
     
     def _get_cache_stats(self) -> Dict:
@@ -261,21 +346,27 @@ class AdminManager:
     
     def _get_system_info(self) -> Dict:
         """获取系统信息"""
-        import psutil
+        if not PSUTIL_AVAILABLE:
+            return {'uptime': self._get_uptime()}
+        
+        # 各取一次快照（每次调用都是一次 statvfs / 读取 /proc/meminfo）
+        disk = psutil.disk_usage('/')
+        memory = psutil.virtual_memory()
         
         return {
             'disk_usage': {
-                'total_gb': round(psutil.disk_usage('/').total / (1024**3), 2),
-                'used_gb': round(psutil.disk_usage('/').used / (1024**3), 2),
-                'free_gb': round(psutil.disk_usage('/').free / (1024**3), 2),
-                'percent': psutil.disk_usage('/').percent
+                'total_gb': round(disk.total / (1024**3), 2),
+                'used_gb': round(disk.used / (1024**3), 2),
+                'free_gb': round(disk.free / (1024**3), 2),
+                'percent': disk.percent
             },
             'memory_usage': {
-                'total_gb': round(psutil.virtual_memory().total / (1024**3), 2),
-                'used_gb': round(psutil.virtual_memory().used / (1024**3), 2),
-                'percent': psutil.virtual_memory().percent
+                'total_gb': round(memory.total / (1024**3), 2),
+                'used_gb': round(memory.used / (1024**3), 2),
+                'percent': memory.percent
             },
-            'cpu_percent': psutil.cpu_percent(interval=1),
+            # 非阻塞：返回距上次调用以来的 CPU 占用（基准在 __init__ 中设置）
+            'cpu_percent': psutil.cpu_percent(interval=None),
             'uptime': self._get_uptime()
         }
     
@@ -295,31 +386,24 @@ class AdminManager:
         if not self.cache:
             return {'papers': [], 'total': 0}
         
-        all_papers = []
-        for paper_hash, paper in self.cache.papers_cache.items():
-            paper_info = {
-                'hash': paper_hash,
-                'title': paper.get('title', '')[:100] + '...' if len(paper.get('title', '')) > 100 else paper.get('title', ''),
+        # 由数据库按发表日期排序并分页，只为当前页构造信息
+        papers_page = []
+        for paper in self.cache.get_papers_by_date(limit, offset):
+            title = paper.get('title') or ''
+            papers_page.append({
+                'hash': paper['hash'],
+                'title': title[:100] + '...' if len(title) > 100 else title,
                 'source': paper.get('source', 'unknown'),
                 'journal': paper.get('journal', ''),
                 'publication_date': paper.get('publication_date', ''),
                 'is_analyzed': paper.get('is_analyzed', False),
                 'keywords_score': paper.get('keywords_score', 0),
                 'impact_factor': paper.get('impact_factor', 0)
-            }
-            all_papers.append(paper_info)
-        
-        # 按日期排序
-        all_papers.sort(key=lambda x: x.get('publication_date', ''), reverse=True)
-        
-        total = len(all_papers)
-        
-        # 分页
-        papers_page = all_papers[offset:offset+limit]
+            })
         
         return {
             'papers': papers_page,
-            'total': total,
+            'total': self.cache.get_total_papers_count(),
             'limit': limit,
             'offset': offset
         }
@@ -329,28 +413,10 @@ class AdminManager:
         if not self.cache:
             return False
         
-        if paper_hash not in self.cache.papers_cache:
+        # 文献和引用它的关键词索引行一起删除（按 paper_id 索引定位）
+        if not self.cache.delete_paper(paper_hash):
             return False
         
-        # 删除文献
-        del self.cache.papers_cache[paper_hash]
-        
-        # 更新缓存文件
-        self.cache._save_cache(
-            self.cache.papers_cache_file, 
-            self.cache.papers_cache
-        )
-        
-        # 从关键词索引中移除
-        for keyword_data in self.cache.keywords_index.values():
-            if paper_hash in keyword_data.get('papers', []):
-                keyword_data['papers'].remove(paper_hash)
-        
-        self.cache._save_cache(
-            self.cache.keywords_index_file,
-            self.cache.keywords_index
-        )
-        
         # 记录日志
         self._log_action('delete_paper', {'paper_hash': paper_hash})
         return True
@@ -363,34 +429,77 @@ class AdminManager:
             'details': details
         }
         
-        logs = []
-        if os.path.exists(self.logs_file):
-            try:
-                with open(self.logs_file, 'r', encoding='utf-8') as f:
-                    logs = json.load(f)
-            except:
-                logs = []
-        
-        logs.append(log_entry)
-        
-        # 只保留最近1000条日志
-        if len(logs) > 1000:
-            logs = logs[-1000:]
-        
-        with open(self.logs_file, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
+        line = json_dumps(log_entry) + '\n'
+        with self._log_lock:
+            self._log_buffer.append(line)
+            batching = self._log_batch_depth > 0
+        if not batching:
+            self.flush_logs()
+    
+    def flush_logs(self):
+        """将缓冲的日志一次追加写入文件"""
+        with self._log_lock:
+            if not self._log_buffer:
+                return
+            lines, self._log_buffer = self._log_buffer, []
+            
+            with open(self.logs_file, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+            
+            # 文件过大时只保留最近1000条日志，并且总大小不超过 _LOG_TRIM_BYTES
+            if os.path.getsize(self.logs_file) > _LOG_ROTATE_BYTES:
+                with open(self.logs_file, 'rb') as f:
+                    recent = deque(f, maxlen=_MAX_LOG_ENTRIES)
+                kept = deque()
+                size = 0
+                for line in reversed(recent):
+                    size += len(line)
+                    if size > _LOG_TRIM_BYTES:
+                        break
+                    kept.appendleft(line.decode('utf-8'))
+                self._write_log_lines(kept)
+    
+    @contextmanager
+    def batched_logs(self):
+        """
+        批量记录日志：块内的 _log_action 只写入内存缓冲，退出时一次性写入文件
+        
+        用法:
+            with admin.batched_logs():
+                for user_id in user_ids:
+                    admin.delete_user(user_id)
+        """
+        with self._log_lock:
+            self._log_batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._log_lock:
+                self._log_batch_depth -= 1
+                done = self._log_batch_depth == 0
+            if done:
+                self.flush_logs()
     
     def get_logs(self, limit: int = 100) -> List[Dict]:
         """获取操作日志"""
+        self.flush_logs()
         if not os.path.exists(self.logs_file):
             return []
         
         try:
-            with open(self.logs_file, 'r', encoding='utf-8') as f:
-                logs = json.load(f)
-            return logs[-limit:]
-        except:
+            # 只保留文件末尾 limit 行，不把整个文件读入内存；按 bytes 读取，由 json_loads 直接解析
+            with open(self.logs_file, 'rb') as f:
+                lines = deque(f, maxlen=limit)
+        except OSError:
             return []
+        
+        logs = []
+        for line in lines:
+            try:
+                logs.append(json_loads(line))
+            except ValueError:
+                continue
+        return logs
     
     def clear_cache(self, cache_type: str = 'all') -> bool:
         """清理缓存"""
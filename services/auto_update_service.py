@@ -47,6 +47,8 @@ class AutoUpdateService:
         self.keyword_group_manager = keyword_group_manager
         self.scheduler = BackgroundScheduler()
         self.jobs = {}  # user_id -> job_id 映射
+        # 错峰偏移使用的随机数生成器（实例内复用）
+        self._rng = random.Random()
         
         # 添加事件监听器
         self.scheduler.add_listener(
@@ -58,11 +60,12 @@ class AutoUpdateService:
     
     def start(self):
         """启动调度器并加载所有用户的自动更新任务"""
+        # 先加载所有用户的自动更新设置：调度器启动前添加的任务只进入待添加列表，
+        # 启动时一次性写入任务存储，不会每添加一个任务就加锁并唤醒调度线程
+        self._load_all_user_schedules()
+        
         self.scheduler.start()
         logger.info("自动更新调度器已启动")
-        
-        # 加载所有用户的自动更新设置
-        self._load_all_user_schedules()
     
     def shutdown(self):
         """关闭调度器"""
@@ -72,18 +75,16 @@ class AutoUpdateService:
     def _load_all_user_schedules(self):
         """加载所有启用了自动更新的用户"""
         try:
-            # 获取所有用户
-            users = self.system.user_manager.get_all_users()
+            # 一次查询取出所有用户的偏好设置，不再逐个用户查询
+            all_prefs = self.system.user_manager.get_all_user_preferences()
             enabled_count = 0
+            # 同一批任务共用一个基准时间
+            now = datetime.now()
             
-            for user in users:
-                user_id = user.get('id')
-                if not user_id:
-                    continue
-                
-                settings = self._get_auto_update_settings(user_id)
+            for user_id, prefs in all_prefs.items():
+                settings = self._get_auto_update_settings(user_id, prefs)
                 if settings.get('enabled'):
-                    self._schedule_user_update(user_id, settings['interval_days'])
+                    self._schedule_user_update(user_id, settings['interval_days'], now)
                     enabled_count += 1
             
             logger.info(f"已加载 {enabled_count} 个用户的自动更新任务")
@@ -91,22 +92,23 @@ class AutoUpdateService:
         except Exception as e:
             logger.error(f"加载用户自动更新任务失败: {e}")
     
-    def _get_auto_update_settings(self, user_id: str) -> Dict:
+    def _get_auto_update_settings(self, user_id: str, prefs: Optional[Dict] = None) -> Dict:
         """
         获取用户的自动更新设置
         
         Args:
             user_id: 用户ID
+            prefs: 已取得的用户偏好设置（为空时按用户ID查询）
             
         Returns:
             自动更新设置字典
         """
         try:
-            user = self.system.user_manager.get_user(user_id)
-            if not user:
-                return {'enabled': False, 'interval_days': self.MIN_INTERVAL_DAYS}
-            
-            prefs = user.get('preferences', {})
+            if prefs is None:
+                user = self.system.user_manager.get_user(user_id)
+                if not user:
+                    return {'enabled': False, 'interval_days': self.MIN_INTERVAL_DAYS}
+                prefs = user.get('preferences', {})
             
             return {
                 'enabled': prefs.get('auto_update_enabled', False),
@@ -120,19 +122,20 @@ class AutoUpdateService:
             logger.error(f"获取用户 {user_id} 自动更新设置失败: {e}")
             return {'enabled': False, 'interval_days': self.MIN_INTERVAL_DAYS}
     
-    def _schedule_user_update(self, user_id: str, interval_days: int):
+    def _schedule_user_update(self, user_id: str, interval_days: int, now: Optional[datetime] = None):
         """
         为指定用户调度更新任务
         
         Args:
             user_id: 用户ID
             interval_days: 更新间隔天数
+            now: 基准时间（默认为当前时间）
         """
         # 移除旧任务
         self._remove_user_schedule(user_id)
         
         # 计算错峰时间（在基准时间上随机偏移 0-30 分钟）
-        stagger_minutes = random.randint(0, self.STAGGER_RANGE_MINUTES)
+        stagger_minutes = self._rng.randint(0, self.STAGGER_RANGE_MINUTES)
         
         # 创建新任务
         job_id = f'auto_update_{user_id}'
@@ -140,7 +143,7 @@ class AutoUpdateService:
             func=self._run_user_update,
             trigger=IntervalTrigger(
                 days=interval_days,
-                start_date=datetime.now() + timedelta(minutes=stagger_minutes)
+                start_date=(now or datetime.now()) + timedelta(minutes=stagger_minutes)
             ),
             id=job_id,
             args=[user_id],
@@ -206,18 +209,18 @@ class AutoUpdateService:
             result: 更新结果
         """
         try:
-            now = datetime.now()
+            now_iso = datetime.now().isoformat()
             
             # 更新用户 preferences
             prefs_update = {
-                'last_auto_update_at': now.isoformat(),
+                'last_auto_update_at': now_iso,
                 'last_auto_update_result': {
                     'fetched': result.get('fetched', 0),
                     'from_cache': result.get('from_cache', 0),
                     'new_analysis': result.get('new_analysis', 0),
                     'cached_analysis': result.get('cached_analysis', 0),
                     'success': True,
-                    'updated_at': now.isoformat()
+                    'updated_at': now_iso
                 }
             }
             
@@ -302,42 +305,13 @@ class AutoUpdateService:
             manual_update_at = prefs.get('last_manual_update_at')
             manual_update_result = prefs.get('last_manual_update_result', {})
             
-            # 比较两个时间，返回最新的
-            from datetime import datetime
-            
-            auto_time = None
-            manual_time = None
-            
-            if auto_update_at:
-                try:
-                    auto_time = datetime.fromisoformat(auto_update_at)
-                except:
-                    pass
-            
-            if manual_update_at:
-                try:
-                    manual_time = datetime.fromisoformat(manual_update_at)
-                except:
-                    pass
-            
-            # 返回最新的更新信息
-            if auto_time and manual_time:
-                if auto_time > manual_time:
-                    return {
-                        'last_update_at': auto_update_at,
-                        'last_update_result': auto_update_result
-                    }
-                else:
-                    return {
-                        'last_update_at': manual_update_at,
-                        'last_update_result': manual_update_result
-                    }
-            elif auto_time:
+            # 两个时间都是 datetime.isoformat() 写入的本地时间，ISO 字符串按字典序比较即按时间比较
+            if auto_update_at and (not manual_update_at or auto_update_at > manual_update_at):
                 return {
                     'last_update_at': auto_update_at,
                     'last_update_result': auto_update_result
                 }
-            elif manual_time:
+            if manual_update_at:
                 return {
                     'last_update_at': manual_update_at,
                     'last_update_result': manual_update_result
@@ -3,13 +3,41 @@
 个性化推送引擎 - 根据用户关键词推送相关文献
 """
 
+import atexit
 import json
 import os
 import re
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Set
 from collections import defaultdict
 
+# Try to import pyahocorasick, fallback to per-keyword matching if not available
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# 关键词组匹配器缓存的最大条目数（超出后整体清空重建）
+_MAX_GROUP_MATCHERS = 256
+
+# 已看文献标记的批量写盘阈值：累计标记数或距上次写盘的秒数，任一达到即写入 user_papers.json
+_SEEN_FLUSH_COUNT = 200
+_SEEN_FLUSH_INTERVAL = 60
+
+# user_papers 中在内存里以 set 保存、写盘时转为有序列表的字段
+_USER_PAPER_SET_FIELDS = ('seen_papers', 'saved_papers')
+
+
+def _at_word_boundary(text: str, pos: int) -> bool:
+    """pos 处是否为单词边界，与正则 \\b 的判定一致"""
+    before = pos > 0 and (text[pos - 1].isalnum() or text[pos - 1] == '_')
+    after = pos < len(text) and (text[pos].isalnum() or text[pos] == '_')
+    return before != after
+
+
 class PersonalizedPushEngine:
     """
     个性化文献推送引擎
@@ -25,8 +53,19 @@ class PersonalizedPushEngine:
         self.push_history_file = os.path.join(data_dir, 'push_history.json')
         
         self._ensure_data_dir()
-        self.user_papers = self._load_json(self.user_papers_file)
+        self.user_papers = self._load_user_papers()
         self.push_history = self._load_json(self.push_history_file)
+        
+        # 已看标记只改内存，累计到阈值后再写盘；进程退出时写入剩余部分
+        self._user_papers_lock = threading.Lock()
+        self._pending_seen = 0
+        self._last_flush = time.monotonic()
+        atexit.register(self._flush_pending)
+        
+        # 关键词组 -> Aho-Corasick 自动机，按关键词元组缓存，组关键词变化后自然换用新的自动机
+        self._group_automatons = {}
+        # 关键词组 -> 预编译的正则与长变体（未安装 pyahocorasick 时使用）
+        self._group_patterns = {}
     
     def _ensure_data_dir(self):
         """确保数据目录存在"""
@@ -48,13 +87,156 @@ class PersonalizedPushEngine:
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
     
-    def _calculate_group_match_score(self, paper: Dict, group: Dict) -> Dict:
+    def _load_user_papers(self) -> Dict:
+        """加载用户文献数据，seen_papers / saved_papers 转为 set，成员判断为 O(1)"""
+        user_papers = self._load_json(self.user_papers_file)
+        for user_data in user_papers.values():
+            for field in _USER_PAPER_SET_FIELDS:
+                user_data[field] = set(user_data.get(field, []))
+        return user_papers
+    
+    def _new_user_data(self) -> Dict:
+        """新用户的文献数据"""
+        return {
+            'seen_papers': set(),
+            'saved_papers': set(),
+            'interactions': []
+        }
+    
+    def flush(self):
+        """将用户文献数据写入文件（set 字段写为有序列表）"""
+        with self._user_papers_lock:
+            data = {}
+            for user_id, user_data in list(self.user_papers.items()):
+                user_copy = dict(user_data)
+                for field in _USER_PAPER_SET_FIELDS:
+                    if field in user_copy:
+                        user_copy[field] = sorted(user_copy[field])
+                data[user_id] = user_copy
+            self._save_json(self.user_papers_file, data)
+            self._pending_seen = 0
+            self._last_flush = time.monotonic()
+    
+    def _flush_pending(self):
+        """写入尚未落盘的已看标记（进程退出时调用）"""
+        if self._pending_seen:
+            self.flush()
+    
+    def _get_group_automaton(self, group_keywords: List[str]):
+        """
+        获取关键词组的 Aho-Corasick 自动机（按关键词元组缓存）
+        
+        每个关键词的变体（原词、去连字符、连字符换空格）都加入自动机，
+        值为 (变体长度, 是否短变体, 所属关键词下标元组)。
+        空变体（如关键词 "-"）无法加入自动机，单独记录其所属关键词下标。
+        
+        Returns:
+            (automaton, empty_owners)，没有非空变体时 automaton 为 None
+        """
+        key = tuple(group_keywords)
+        if key in self._group_automatons:
+            return self._group_automatons[key]
+        
+        variant_owners = defaultdict(list)
+        for kw_idx, keyword in enumerate(group_keywords):
+            kw = keyword.lower()
+            for variant in {kw, kw.replace('-', ''), kw.replace('-', ' ')}:
+                variant_owners[variant].append(kw_idx)
+        empty_owners = tuple(variant_owners.pop('', ()))
+        
+        automaton = None
+        if variant_owners:
+            automaton = ahocorasick.Automaton()
+            for variant, owners in variant_owners.items():
+                automaton.add_word(variant, (len(variant), len(variant) <= 3, tuple(owners)))
+            automaton.make_automaton()
+        
+        if len(self._group_automatons) >= _MAX_GROUP_MATCHERS:
+            self._group_automatons.clear()
+        self._group_automatons[key] = (automaton, empty_owners)
+        return automaton, empty_owners
+    
+    def _scan_keywords(self, automaton, empty_owners: tuple, text: str) -> Set[int]:
+        """用自动机扫描一遍文本，返回命中的关键词下标"""
+        matched = set()
+        # 空变体按 \b\b 处理：文本中存在单词边界即命中
+        if empty_owners and re.search(r'\b', text):
+            matched.update(empty_owners)
+        if automaton is None:
+            return matched
+        for end_idx, (length, is_short, owners) in automaton.iter(text):
+            # 短关键词需要单词边界，避免误匹配
+            if is_short and not (_at_word_boundary(text, end_idx - length + 1)
+                                 and _at_word_boundary(text, end_idx + 1)):
+                continue
+            matched.update(owners)
+        return matched
+    
+    def _score_keywords_with_automaton(self, group_keywords: List[str],
+                                       title: str, abstract: str) -> List[int]:
+        """标题、摘要各扫描一遍，得到每个关键词的得分（标题命中 5 分，摘要命中 2 分）"""
+        automaton, empty_owners = self._get_group_automaton(group_keywords)
+        title_hits = self._scan_keywords(automaton, empty_owners, title)
+        abstract_hits = self._scan_keywords(automaton, empty_owners, abstract)
+        return [
+            (5 if kw_idx in title_hits else 0) + (2 if kw_idx in abstract_hits else 0)
+            for kw_idx in range(len(group_keywords))
+        ]
+    
+    def _get_compiled_group_patterns(self, group_keywords: List[str]) -> List[tuple]:
+        """
+        预编译关键词组的匹配规则（按关键词元组缓存）
+        
+        Returns:
+            与 group_keywords 对齐的 (short_pattern, long_variants) 列表：
+            short_pattern 为该关键词所有短变体（<= 3 字符）合成的单词边界正则，没有短变体时为 None；
+            long_variants 为长变体元组，直接做子串匹配
+        """
+        key = tuple(group_keywords)
+        if key in self._group_patterns:
+            return self._group_patterns[key]
+        
+        compiled = []
+        for keyword in group_keywords:
+            kw = keyword.lower()
+            kw_variants = dict.fromkeys([kw, kw.replace('-', ''), kw.replace('-', ' ')])
+            short_variants = [v for v in kw_variants if len(v) <= 3]
+            long_variants = tuple(v for v in kw_variants if len(v) > 3)
+            short_pattern = None
+            if short_variants:
+                short_pattern = re.compile(
+                    r'\b(?:' + '|'.join(re.escape(v) for v in short_variants) + r')\b'
+                )
+            compiled.append((short_pattern, long_variants))
+        
+        if len(self._group_patterns) >= _MAX_GROUP_MATCHERS:
+            self._group_patterns.clear()
+        self._group_patterns[key] = compiled
+        return compiled
+    
+    def _score_keywords_with_regex(self, group_keywords: List[str],
+                                   title: str, abstract: str) -> List[int]:
+        """逐个关键词匹配（未安装 pyahocorasick 时使用），得分规则同上"""
+        keyword_scores = []
+        for short_pattern, long_variants in self._get_compiled_group_patterns(group_keywords):
+            keyword_score = 0
+            # 长关键词宽松匹配，短关键词使用单词边界，避免误匹配
+            if any(v in title for v in long_variants) or (short_pattern and short_pattern.search(title)):
+                keyword_score += 5
+            if any(v in abstract for v in long_variants) or (short_pattern and short_pattern.search(abstract)):
+                keyword_score += 2
+            keyword_scores.append(keyword_score)
+        return keyword_scores
+    
+    def _calculate_group_match_score(self, paper: Dict, group: Dict,
+                                     now: Optional[datetime] = None) -> Dict:
         """
         计算文献与单个关键词组的匹配分数
         
         Args:
             paper: 文献数据
             group: 关键词组数据，包含 keywords, match_mode 等
+            now: 计算发表时间分数的当前时间（批量评分时由调用方传入，默认取当前时间）
             
         Returns:
             {
@@ -81,38 +263,12 @@ class PersonalizedPushEngine:
         matched_keywords = []
         total_keyword_score = 0
         
-        for keyword in group_keywords:
-            kw = keyword.lower()
-            kw_variants = [kw, kw.replace('-', ''), kw.replace('-', ' ')]
-            
-            keyword_score = 0
-            for variant in kw_variants:
-                # 使用单词边界匹配，避免短关键词误匹配
-                if len(variant) <= 3:
-                    # 短关键词使用单词边界
-                    pattern = r'\b' + re.escape(variant) + r'\b'
-                    if re.search(pattern, title):
-                        keyword_score += 5
-                        break
-                else:
-                    # 长关键词可以宽松匹配
-                    if variant in title:
-                        keyword_score += 5
-                        break
-            
-            for variant in kw_variants:
-                if len(variant) <= 3:
-                    # 短关键词使用单词边界
-                    pattern = r'\b' + re.escape(variant) + r'\b'
-                    if re.search(pattern, abstract):
-                        keyword_score += 2
-                        break
-                else:
-                    # 长关键词可以宽松匹配
-                    if variant in abstract:
-                        keyword_score += 2
-                        break
-            
+        if AHOCORASICK_AVAILABLE:
+            keyword_scores = self._score_keywords_with_automaton(group_keywords, title, abstract)
+        else:
+            keyword_scores = self._score_keywords_with_regex(group_keywords, title, abstract)
+        
+        for keyword, keyword_score in zip(group_keywords, keyword_scores):
             if keyword_score > 0:
                 matched_keywords.append(keyword)
                 total_keyword_score += keyword_score
@@ -137,7 +293,7 @@ class PersonalizedPushEngine:
             if pub_date:
                 if isinstance(pub_date, str):
                     pub_date = datetime.fromisoformat(pub_date.replace('Z', '+00:00'))
-                days_old = (datetime.now() - pub_date).days
+                days_old = ((now or datetime.now()) - pub_date).days
                 
                 if days_old <= 1:
                     time_score = 10
@@ -238,7 +394,8 @@ class PersonalizedPushEngine:
                 except:
                     pass
         
-        # 评分和筛选
+        # 评分和筛选（当前时间在循环外取一次）
+        now = datetime.now()
         scored_papers = []
         for paper in available_papers:
             # 跳过无效的文献数据
@@ -252,7 +409,7 @@ class PersonalizedPushEngine:
                 continue
             
             # 计算与该组的匹配分数
-            match_result = self._calculate_group_match_score(paper, group)
+            match_result = self._calculate_group_match_score(paper, group, now)
             score = match_result['score']
             
             # 只要有任何关键词匹配就显示（分数>0）
@@ -300,7 +457,15 @@ class PersonalizedPushEngine:
         # 获取用户已看过的文献
         seen_papers = set()
         if exclude_seen and user_id in self.user_papers:
-            seen_papers = set(self.user_papers[user_id].get('seen_papers', []))
+            seen_papers = self.user_papers[user_id]['seen_papers']
+        
+        # 用户所有关键词作为一个临时组，与 _calculate_paper_score 一致，只在循环外创建一次
+        temp_group = {
+            'keywords': user_keywords,
+            'match_mode': 'any',
+            'min_match_score': 0.3
+        }
+        now = datetime.now()
         
         # 评分和筛选
         scored_papers = []
@@ -316,7 +481,7 @@ class PersonalizedPushEngine:
                 continue
             
             # 计算分数
-            score = self._calculate_paper_score(paper, user_keywords)
+            score = self._calculate_group_match_score(paper, temp_group, now)['score']
             
             # 只要有任何关键词匹配就显示（分数>0）
             if score >= 1:
@@ -353,19 +518,18 @@ class PersonalizedPushEngine:
             user_id: 用户ID
             paper_hashes: 文献哈希列表
         """
-        if user_id not in self.user_papers:
-            self.user_papers[user_id] = {
-                'seen_papers': [],
-                'saved_papers': [],
-                'interactions': []
-            }
-        
-        # 添加新的已看文献
-        for paper_hash in paper_hashes:
-            if paper_hash not in self.user_papers[user_id]['seen_papers']:
-                self.user_papers[user_id]['seen_papers'].append(paper_hash)
-        
-        self._save_json(self.user_papers_file, self.user_papers)
+        with self._user_papers_lock:
+            if user_id not in self.user_papers:
+                self.user_papers[user_id] = self._new_user_data()
+            
+            # 添加新的已看文献，不立即写盘
+            self.user_papers[user_id]['seen_papers'].update(paper_hashes)
+            self._pending_seen += len(paper_hashes)
+            need_flush = (self._pending_seen >= _SEEN_FLUSH_COUNT
+                          or time.monotonic() - self._last_flush >= _SEEN_FLUSH_INTERVAL)
+        
+        if need_flush:
+            self.flush()
     
     def save_paper_for_user(self, user_id: str, paper_hash: str):
         """
@@ -375,23 +539,28 @@ class PersonalizedPushEngine:
             user_id: 用户ID
             paper_hash: 文献哈希
         """
-        if user_id not in self.user_papers:
-            self.user_papers[user_id] = {
-                'seen_papers': [],
-                'saved_papers': [],
-                'interactions': []
-            }
+        with self._user_papers_lock:
+            if user_id not in self.user_papers:
+                self.user_papers[user_id] = self._new_user_data()
+            
+            saved_papers = self.user_papers[user_id]['saved_papers']
+            changed = paper_hash not in saved_papers
+            saved_papers.add(paper_hash)
         
-        if paper_hash not in self.user_papers[user_id]['saved_papers']:
-            self.user_papers[user_id]['saved_papers'].append(paper_hash)
-            self._save_json(self.user_papers_file, self.user_papers)
+        if changed:
+            self.flush()
     
     def unsave_paper_for_user(self, user_id: str, paper_hash: str):
         """取消收藏"""
-        if user_id in self.user_papers:
-            if paper_hash in self.user_papers[user_id]['saved_papers']:
-                self.user_papers[user_id]['saved_papers'].remove(paper_hash)
-                self._save_json(self.user_papers_file, self.user_papers)
+        with self._user_papers_lock:
+            changed = False
+            if user_id in self.user_papers:
+                saved_papers = self.user_papers[user_id]['saved_papers']
+                changed = paper_hash in saved_papers
+                saved_papers.discard(paper_hash)
+        
+        if changed:
+            self.flush()
     
     def record_interaction(self, user_id: str, paper_hash: str, 
                           interaction_type: str, metadata: Dict = None):
@@ -404,13 +573,6 @@ class PersonalizedPushEngine:
             interaction_type: 交互类型（view, click, save, share）
             metadata: 额外元数据
         """
-        if user_id not in self.user_papers:
-            self.user_papers[user_id] = {
-                'seen_papers': [],
-                'saved_papers': [],
-                'interactions': []
-            }
-        
         interaction = {
             'paper_hash': paper_hash,
             'type': interaction_type,
@@ -418,14 +580,18 @@ class PersonalizedPushEngine:
             'metadata': metadata or {}
         }
         
-        self.user_papers[user_id]['interactions'].append(interaction)
-        
-        # 限制交互记录数量（保留最近1000条）
-        interactions = self.user_papers[user_id]['interactions']
-        if len(interactions) > 1000:
-            self.user_papers[user_id]['interactions'] = interactions[-1000:]
+        with self._user_papers_lock:
+            if user_id not in self.user_papers:
+                self.user_papers[user_id] = self._new_user_data()
+            
+            self.user_papers[user_id]['interactions'].append(interaction)
+            
+            # 限制交互记录数量（保留最近1000条）
+            interactions = self.user_papers[user_id]['interactions']
+            if len(interactions) > 1000:
+                self.user_papers[user_id]['interactions'] = interactions[-1000:]
         
-        self._save_json(self.user_papers_file, self.user_papers)
+        self.flush()
     
     def get_user_feed(self, user_id: str, user_keywords: List[str],
                      all_papers: List[Dict], page: int = 1, 
@@ -457,7 +623,7 @@ class PersonalizedPushEngine:
         # 获取用户收藏的文献
         saved_papers = []
         if user_id in self.user_papers:
-            saved_hashes = set(self.user_papers[user_id].get('saved_papers', []))
+            saved_hashes = self.user_papers[user_id]['saved_papers']
             for paper in all_papers:
                 paper_hash = paper.get('hash') or self._get_paper_hash(paper)
                 if paper_hash in saved_hashes:
@@ -587,16 +753,17 @@ class PersonalizedPushEngine:
             del self.push_history[push_id]
         
         # 清理用户交互记录
-        for user_id, user_data in self.user_papers.items():
-            interactions = user_data.get('interactions', [])
-            filtered_interactions = [
-                i for i in interactions 
-                if i.get('timestamp', '2000-01-01') >= cutoff
-            ]
-            user_data['interactions'] = filtered_interactions
+        with self._user_papers_lock:
+            for user_id, user_data in self.user_papers.items():
+                interactions = user_data.get('interactions', [])
+                filtered_interactions = [
+                    i for i in interactions 
+                    if i.get('timestamp', '2000-01-01') >= cutoff
+                ]
+                user_data['interactions'] = filtered_interactions
         
         self._save_json(self.push_history_file, self.push_history)
-        self._save_json(self.user_papers_file, self.user_papers)
+        self.flush()
         
         return {
             'removed_pushes': len(pushes_to_remove)
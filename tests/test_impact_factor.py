@@ -105,6 +105,49 @@ class TestImpactFactorFuzzy:
         assert result == 3.7, f"Expected 3.7, got {result}"
 
 
+
+class TestImpactFactorBatch:
+    """批量查询测试"""
+    
+    def setup_method(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fetcher = ImpactFactorFetcher(os.path.join(self.tmp_dir, 'if_cache.json'))
+    
+    def teardown_method(self):
+        import shutil
+        if os.path.exists(self.tmp_dir):
+            shutil.rmtree(self.tmp_dir)
+    
+    def test_batch_resolves_each_journal_once(self):
+        """测试每批中每个期刊只解析一次"""
+        calls = []
+        original = self.fetcher.get_impact_factor
+        
+        def counting_get(journal_name):
+            calls.append(journal_name)
+            return original(journal_name)
+        
+        self.fetcher.get_impact_factor = counting_get
+        papers = [{'journal': 'Nature'}, {'journal': 'Cell'}, {'journal': 'Nature'}]
+        self.fetcher.batch_get_impact_factors(papers)
+        self.fetcher.batch_get_impact_factors([{'journal': 'Cell'}])
+        
+        # 同一批内只解析一次，下一批重新解析
+        assert calls == ['Nature', 'Cell', 'Cell']
+        assert [p['impact_factor'] for p in papers] == [64.8, 64.5, 64.8]
+    
+    def test_failed_lookup_retried_next_batch(self):
+        """测试查询失败的期刊在下一批重新查询，而不是一直为0"""
+        results = iter([None, 5.2])
+        self.fetcher.get_impact_factor = lambda journal_name: next(results)
+        
+        first = self.fetcher.batch_get_impact_factors([{'journal': 'Some Journal'}])
+        assert first[0]['impact_factor'] == 0.0
+        
+        second = self.fetcher.batch_get_impact_factors([{'journal': 'Some Journal'}])
+        assert second[0]['impact_factor'] == 5.2
+
 if __name__ == '__main__':
     import pytest
     pytest.main([__file__, '-v'])
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+密码哈希测试 - 验证 argon2 / PBKDF2 哈希、旧版哈希兼容及登录时升级
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hashlib
+import shutil
+import tempfile
+
+import pytest
+
+import models.simple_db as simple_db
+import models.user_manager as user_manager
+from models.user_manager import UserManager
+
+
+def _legacy_hash(password, salt):
+    """旧版无前缀 PBKDF2-SHA256 哈希"""
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000).hex()
+
+
+class TestPasswordHash:
+    """哈希与验证测试"""
+
+    def setup_method(self):
+        """每个测试方法执行前调用"""
+        self.manager = UserManager(db_path=':memory:')
+
+    @pytest.mark.skipif(not user_manager.ARGON2_AVAILABLE, reason='未安装 argon2-cffi')
+    def test_argon2_round_trip(self):
+        """测试 argon2 哈希与验证"""
+        hashed, salt = self.manager._hash_password('secret-123')
+
+        assert hashed.startswith('$argon2')
+        assert salt == ''
+        assert self.manager._verify_password('secret-123', hashed, salt) is True
+        assert self.manager._needs_rehash(hashed) is False
+
+    @pytest.mark.skipif(not user_manager.ARGON2_AVAILABLE, reason='未安装 argon2-cffi')
+    def test_argon2_wrong_password(self):
+        """测试 argon2 哈希下错误密码"""
+        hashed, salt = self.manager._hash_password('secret-123')
+
+        assert self.manager._verify_password('secret-124', hashed, salt) is False
+
+    def test_pbkdf2_sha512_round_trip(self, monkeypatch):
+        """测试带前缀的 PBKDF2-SHA512 哈希与验证"""
+        monkeypatch.setattr(user_manager, 'ARGON2_AVAILABLE', False)
+        hashed, salt = self.manager._hash_password('secret-123')
+
+        prefix, iterations, digest = hashed.split('$')
+        assert prefix == 'pbkdf2_sha512'
+        assert int(iterations) == user_manager.PBKDF2_ITERATIONS
+        assert len(digest) == 128
+        assert salt
+        assert self.manager._verify_password('secret-123', hashed, salt) is True
+        assert self.manager._needs_rehash(hashed) is False
+
+    def test_pbkdf2_sha512_wrong_password(self, monkeypatch):
+        """测试 PBKDF2-SHA512 哈希下错误密码"""
+        monkeypatch.setattr(user_manager, 'ARGON2_AVAILABLE', False)
+        hashed, salt = self.manager._hash_password('secret-123')
+
+        assert self.manager._verify_password('secret-124', hashed, salt) is False
+        assert self.manager._verify_password('secret-123', hashed, 'other-salt') is False
+
+    def test_legacy_hash(self):
+        """测试旧版无前缀哈希的验证与升级判断"""
+        hashed = _legacy_hash('secret-123', 'abcd')
+
+        assert self.manager._verify_password('secret-123', hashed, 'abcd') is True
+        assert self.manager._verify_password('secret-124', hashed, 'abcd') is False
+        assert self.manager._needs_rehash(hashed) is True
+
+    def test_empty_hash(self):
+        """测试空哈希始终验证失败"""
+        assert self.manager._verify_password('', '', '') is False
+
+
+class TestPasswordUpgrade:
+    """登录时旧版哈希升级测试"""
+
+    def setup_method(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        # 全局数据库实例在测试结束后还原，避免影响其他测试
+        self._saved_db = simple_db._db_instance
+        self.db = simple_db.get_db(self.db_path)
+        self.manager = UserManager(db_path=self.db_path)
+        result = self.manager.register_user('legacy_user', 'legacy@example.com', 'old-pass')
+        self.user_id = result['user_id']
+        self.db.execute("UPDATE users SET password_hash = ?, password_salt = ? WHERE id = ?",
+                        (_legacy_hash('old-pass', 'abcd'), 'abcd', self.user_id))
+
+    def teardown_method(self):
+        simple_db._db_instance = self._saved_db
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+
+    def _stored_hash(self):
+        row = self.db.fetchone_row("SELECT password_hash, password_salt FROM users WHERE id = ?",
+                                   (self.user_id,))
+        return row[0], row[1]
+
+    def test_legacy_login_rehashes(self):
+        """测试旧版哈希登录成功后升级为当前算法"""
+        result = self.manager.login('legacy_user', 'old-pass')
+        assert result['success'] is True
+
+        hashed, salt = self._stored_hash()
+        assert hashed != _legacy_hash('old-pass', 'abcd')
+        assert self.manager._needs_rehash(hashed) is False
+        assert self.manager._verify_password('old-pass', hashed, salt) is True
+
+        # 升级后的哈希可以再次登录
+        assert self.manager.login('legacy_user', 'old-pass')['success'] is True
+
+    def test_legacy_wrong_password_keeps_hash(self):
+        """测试旧版哈希下错误密码登录失败且不升级"""
+        result = self.manager.login('legacy_user', 'wrong-pass')
+        assert result['success'] is False
+
+        assert self._stored_hash() == (_legacy_hash('old-pass', 'abcd'), 'abcd')
+
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
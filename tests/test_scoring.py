@@ -7,6 +7,14 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import random
+import shutil
+import tempfile
+
+import pytest
+
+import services.push_service as push_service
+from services.push_service import PersonalizedPushEngine
 from v1.scorer import KeywordScorer
 
 
@@ -160,6 +168,71 @@ class TestPaperScorerSorting:
         assert scores == sorted(scores, reverse=True)
 
 
+# (关键词组, 小写标题, 小写摘要, 期望的各关键词得分)
+GROUP_MATCH_CASES = [
+    # 短关键词需要单词边界
+    (['il', 'tnf'], 'il-6 signaling in illness', 'tnfa and tnf', [5, 2]),
+    (['ai'], 'training a model', 'said ai_x', [0]),
+    # 连字符变体：原词、去连字符、连字符换空格
+    (['IL-6', 'pd-l1'], 'il6 levels', 'il 6 expression and pdl1', [7, 2]),
+    # 关键词之间互相重叠
+    (['breast cancer', 'cancer', 'a'], 'breast cancer risk', 'a cancer cohort', [5, 7, 2]),
+    # 只有 "-" 的关键词（含空变体，按 \b\b 处理）
+    (['-'], 'x', '', [5]),
+    (['-', 'b'], '--', 'a-b', [2, 2]),
+]
+
+
+class TestGroupKeywordMatching:
+    """关键词组匹配测试（自动机与逐词正则两种实现的规则一致）"""
+    
+    def setup_method(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.engine = PersonalizedPushEngine(data_dir=self.temp_dir)
+    
+    def teardown_method(self):
+        if os.path.exists(self.temp_dir):
+            shutil.rmtree(self.temp_dir)
+    
+    @pytest.mark.parametrize('keywords,title,abstract,expected', GROUP_MATCH_CASES)
+    def test_regex_scores(self, keywords, title, abstract, expected):
+        """测试逐词正则匹配的得分"""
+        assert self.engine._score_keywords_with_regex(keywords, title, abstract) == expected
+    
+    @pytest.mark.skipif(not push_service.AHOCORASICK_AVAILABLE, reason='未安装 pyahocorasick')
+    @pytest.mark.parametrize('keywords,title,abstract,expected', GROUP_MATCH_CASES)
+    def test_automaton_scores(self, keywords, title, abstract, expected):
+        """测试自动机匹配的得分"""
+        assert self.engine._score_keywords_with_automaton(keywords, title, abstract) == expected
+    
+    @pytest.mark.skipif(not push_service.AHOCORASICK_AVAILABLE, reason='未安装 pyahocorasick')
+    def test_automaton_matches_regex_random(self):
+        """测试随机关键词和文本下两种实现得分一致"""
+        rng = random.Random(0)
+        alphabet = 'abc -_1+.é'
+        pool = ['il-6', 'il6', 'ab', 'a', 'b c', 'a-b', 'abc', 'c+', '-', '_a', 'é']
+        
+        def word(n):
+            return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, n)))
+        
+        for _ in range(2000):
+            keywords = rng.sample(pool, rng.randint(1, 4)) + [word(4) for _ in range(rng.randint(0, 2))]
+            title, abstract = word(30), word(80)
+            assert (self.engine._score_keywords_with_automaton(keywords, title, abstract)
+                    == self.engine._score_keywords_with_regex(keywords, title, abstract))
+    
+    def test_group_match_score(self):
+        """测试组匹配结果（标题命中 5 分、摘要命中 2 分，关键词分乘 7 封顶 70）"""
+        group = {'keywords': ['IL-6', 'tnf', 'cancer'], 'match_mode': 'any'}
+        paper = {'title': 'IL6 in Cancer', 'abstract': 'TNF-alpha and cancer', 'paper_type': 'review'}
+        
+        result = self.engine._calculate_group_match_score(paper, group)
+        
+        assert result['matched_keywords'] == ['IL-6', 'tnf', 'cancer']
+        assert result['match_details']['keyword_score'] == 70
+        assert result['score'] == 77
+
+
 if __name__ == '__main__':
     import pytest
     pytest.main([__file__, '-v'])
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+JSON 工具模块 - 数据库 JSON 列及 JSON 文件的序列化/反序列化
+优先使用 orjson（更快，可直接解析 bytes），未安装时回退到标准库 json
+"""
+
+import json
+import os
+import threading
+
+# Try to import orjson, fallback to stdlib json if not available
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _atomic_write(path, data: bytes):
+    """先写入同目录下的临时文件再 os.replace，写入中途崩溃不会留下半个文件"""
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+if ORJSON_AVAILABLE:
+    # 与标准库行为保持一致：允许非字符串键（如 int）
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    # orjson.loads 同时接受 str 和 bytes，解析失败抛出的异常是 ValueError 的子类
+    json_loads = orjson.loads
+
+    def json_dumps(value) -> str:
+        """序列化为 JSON 字符串"""
+        try:
+            return orjson.dumps(value, option=_ORJSON_OPTIONS).decode()
+        except TypeError:
+            # orjson 不支持的输入（如超出 64 位的整数）交给标准库处理
+            return json.dumps(value)
+
+    def json_load_file(path):
+        """读取 JSON 文件（按 bytes 读入直接解析，省去解码为 str）"""
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+
+    def json_dump_file(value, path):
+        """写入 JSON 文件（2 空格缩进，非 ASCII 字符原样输出）"""
+        try:
+            data = orjson.dumps(value, option=_ORJSON_OPTIONS | orjson.OPT_INDENT_2)
+        except TypeError:
+            data = json.dumps(value, ensure_ascii=False, indent=2).encode('utf-8')
+        _atomic_write(path, data)
+else:
+    json_loads = json.loads
+
+    def json_dumps(value) -> str:
+        """序列化为 JSON 字符串"""
+        return json.dumps(value)
+
+    def json_load_file(path):
+        """读取 JSON 文件"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def json_dump_file(value, path):
+        """写入 JSON 文件（2 空格缩进，非 ASCII 字符原样输出）"""
+        _atomic_write(path, json.dumps(value, ensure_ascii=False, indent=2).encode('utf-8'))
@@ -1043,13 +1043,16 @@ class PaperFetcher:
         print(f"  - 成功: {success_count}/{len(sources)} 个源")
         print(f"  - 总计: {total_papers} 篇文献")
         
-        # 去重(基于标题+DOI)
+        # 去重(基于标题+DOI)，同时把发表日期统一为 ISO 字符串，下游可直接 JSON 序列化
         seen = set()
         unique_papers = []
         for paper in all_papers:
             key = (paper.get('title', ''), paper.get('doi', ''))
             if key not in seen:
                 seen.add(key)
+                pub_date = paper.get('publication_date')
+                if isinstance(pub_date, datetime):
+                    paper['publication_date'] = pub_date.isoformat()
                 unique_papers.append(paper)
         
         if len(unique_papers) < len(all_papers):
@@ -1258,11 +1258,25 @@ class ImpactFactorFetcher:
         
         return None
     
+    def _resolve_journals(self, journals: List[str]) -> Dict[str, Optional[float]]:
+        """
+        解析一批期刊的影响因子，每个不同的期刊名只查询一次（包括外部API查询）
+        
+        结果只用于本次批量查询，不跨调用保留：外部查询失败的期刊下次会重试
+        
+        Args:
+            journals: 期刊名称列表（可包含重复）
+            
+        Returns:
+            期刊名 -> 影响因子（未找到为None）的映射
+        """
+        return {journal: self.get_impact_factor(journal) for journal in dict.fromkeys(journals)}
+    
     def batch_get_impact_factors(self, papers: List[Dict]) -> List[Dict]:
         """批量获取影响因子"""
+        resolved = self._resolve_journals([paper.get('journal', '') for paper in papers])
         for paper in papers:
-            journal = paper.get('journal', '')
-            if_value = self.get_impact_factor(journal)
+            if_value = resolved[paper.get('journal', '')]
             # 如果没有找到影响因子，默认为0.0
             if if_value is None:
                 if_value = 0.0